@@ -0,0 +1,190 @@
+import re
+
+# Issue code -> what it means, in report order
+ISSUES = {
+    "missing-lang": "no lang attribute on <html>",
+    "missing-title": "no <title>, or an empty one",
+    "img-alt": "image without alt text",
+    "heading-skip": "heading level skipped (e.g. h2 followed by h4)",
+    "empty-heading": "heading with no text",
+    "no-h1": "no <h1> on the page",
+    "unlabelled-control": "form control without a label",
+    "empty-link": "link with no text or accessible name",
+    "vague-link": "link text that says nothing out of context",
+    "empty-button": "button with no text or accessible name",
+    "frame-title": "iframe without a title",
+    "no-main": "no <main> landmark",
+}
+
+# Link texts that mean nothing when read out in a list of links
+VAGUE_LINK_TEXT = {"click here", "here", "more", "read more", "learn more", "link", "this", "continue", "details"}
+# <input> types that need no label of their own
+UNLABELLED_INPUT_TYPES = {"hidden", "submit", "reset", "button", "image"}
+# Examples kept per issue code
+MAX_SAMPLES = 3
+
+_SPACE = re.compile(r"\s+")
+
+def _text(element):
+    """Visible text of an element plus the alt text of images inside it"""
+    parts = [element.text_content()]
+    parts.extend(image.get("alt", "") for image in element.iter("img"))
+    return _SPACE.sub(" ", " ".join(parts)).strip()
+
+def _named(element):
+    return bool(element.get("aria-label", "").strip() or element.get("aria-labelledby") or element.get("title"))
+
+def _hidden(element):
+    return element.get("aria-hidden") == "true" or element.get("role") in ("presentation", "none")
+
+def _describe(element):
+    """Short identification of an element for report samples"""
+    for name in ("id", "name", "src", "href"):
+        value = element.get(name)
+        if value:
+            return f"<{element.tag} {name}={value[:80]!r}>"
+    text = _text(element)
+    return f"<{element.tag}>{text[:40]}" if text else f"<{element.tag}>"
+
+def analyze(tree):
+    """
+    Collect accessibility signals from a parsed page (an lxml.html tree,
+    e.g. from trafilatura.load_html) in one walk over its elements.
+
+    Returns (report, hrefs). The report has element counts, `lang`,
+    `title`, `issues` (code -> count, see ISSUES) and `samples` (code -> up
+    to MAX_SAMPLES examples). `hrefs` are the href values of every <a> and
+    <area>, so that a crawler needs no second parse to find links.
+    """
+    report = {
+        "lang": tree.get("lang") or tree.get("xml:lang") or None,
+        "title": None,
+        "images": 0,
+        "headings": 0,
+        "form_controls": 0,
+        "links": 0,
+        "issues": {},
+        "samples": {},
+    }
+    hrefs = []
+    label_targets = set()
+    controls = []
+    previous_level = 0
+    h1_count = 0
+    has_main = False
+
+    def issue(code, element=None):
+        report["issues"][code] = report["issues"].get(code, 0) + 1
+        if element is not None:
+            samples = report["samples"].setdefault(code, [])
+            if len(samples) < MAX_SAMPLES:
+                samples.append(_describe(element))
+
+    for element in tree.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+        if tag == "main" or element.get("role") == "main":
+            has_main = True
+        if tag == "title" and report["title"] is None:
+            report["title"] = _SPACE.sub(" ", element.text_content()).strip()
+        elif tag == "img":
+            report["images"] += 1
+            if element.get("alt") is None and not _hidden(element) and not _named(element):
+                issue("img-alt", element)
+        elif tag in ("a", "area"):
+            href = element.get("href")
+            if href is None:
+                continue
+            hrefs.append(href)
+            report["links"] += 1
+            if tag == "area":
+                if element.get("alt") is None and not _named(element):
+                    issue("img-alt", element)
+                continue
+            text = _text(element)
+            if not text and not _named(element):
+                issue("empty-link", element)
+            elif text.lower().rstrip(".!…›»> ") in VAGUE_LINK_TEXT:
+                issue("vague-link", element)
+        elif len(tag) == 2 and tag[0] == "h" and tag[1] in "123456":
+            level = int(tag[1])
+            report["headings"] += 1
+            h1_count += level == 1
+            if previous_level and level > previous_level + 1:
+                issue("heading-skip", element)
+            previous_level = level
+            if not _text(element) and not _named(element):
+                issue("empty-heading", element)
+        elif tag == "label":
+            if element.get("for"):
+                label_targets.add(element.get("for"))
+        elif tag in ("input", "select", "textarea"):
+            input_type = element.get("type", "text").lower()
+            if tag == "input" and input_type in UNLABELLED_INPUT_TYPES:
+                if input_type == "image" and element.get("alt") is None and not _named(element):
+                    issue("img-alt", element)
+                continue
+            report["form_controls"] += 1
+            if not _named(element) and next(element.iterancestors("label"), None) is None:
+                # <label for=...> may come later in the document
+                controls.append(element)
+        elif tag == "button":
+            if not _text(element) and not _named(element):
+                issue("empty-button", element)
+        elif tag == "iframe":
+            if not element.get("title", "").strip() and not _named(element) and not _hidden(element):
+                issue("frame-title", element)
+
+    for control in controls:
+        if control.get("id") not in label_targets:
+            issue("unlabelled-control", control)
+    if not report["lang"]:
+        issue("missing-lang")
+    if not report["title"]:
+        issue("missing-title")
+    if report["headings"] and not h1_count:
+        issue("no-h1")
+    if not has_main:
+        issue("no-main")
+    return report, hrefs
+
+def analyze_page(body, options=None, extract=True):
+    """
+    Parse a page once and return (text, report, hrefs): trafilatura's
+    extraction from that same tree (None when `extract` is false, e.g.
+    because the text is memoized) and the results of analyze().
+    """
+    import trafilatura
+    tree = trafilatura.load_html(body)
+    if tree is None:
+        return None, None, []
+    # Analyze first: extraction is free to prune the tree
+    report, hrefs = analyze(tree)
+    text = trafilatura.extract(tree, **(options or {})) if extract else None
+    return text, report, hrefs
+
+def summarize(reports):
+    """Fold page reports into {issue code: pages affected}, in ISSUES order"""
+    pages = {}
+    for report in reports:
+        if report is None:
+            continue
+        for code in report["issues"]:
+            pages[code] = pages.get(code, 0) + 1
+    return {code: pages[code] for code in ISSUES if code in pages}
+
+def format_report(report):
+    """One line per issue found: count, code, meaning and examples"""
+    if report is None:
+        return "  (not analyzed)"
+    if not report["issues"]:
+        return "  no issues found"
+    lines = []
+    for code in ISSUES:
+        count = report["issues"].get(code)
+        if count:
+            samples = ", ".join(report["samples"].get(code, []))
+            lines.append(f"  {count:>4} {code:<20}{ISSUES[code]}" + (f": {samples}" if samples else ""))
+    return "\n".join(lines)
@@ -0,0 +1,274 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import extract_memo
+from circuit_breaker import get_breaker
+from timeouts import deadline
+from tracing import format_summary, get_tracer
+
+def _host(target):
+    if "://" in target:
+        return urlsplit(target).hostname
+    return target.split("/")[0].split(":")[0]
+
+def _port(target):
+    """Explicit port of a target, or None"""
+    return urlsplit(target if "://" in target else f"//{target}").port
+
+def _url(target, scheme="https"):
+    return target if "://" in target else f"{scheme}://{target}"
+
+def run_connectivity(target, timeout):
+    import asyncio
+    from check_connectivity import scan_connectivity
+    ports = (_port(target),) if _port(target) else (80, 443)
+    addresses = asyncio.run(scan_connectivity([_host(target)], ports=ports, timeout=timeout))
+    return {
+        "ok": any(address["connected"] for address in addresses),
+        "addresses": addresses,
+    }
+
+def run_headers(target, timeout):
+    from check_headers import head_request
+    parts = urlsplit(_url(target))
+    use_ssl = parts.scheme == "https"
+    port = parts.port or (443 if use_ssl else 80)
+    result = head_request(parts.hostname, port, use_ssl, parts.path or "/", timeout)
+    result["ok"] = result["error"] is None
+    result["headers"] = dict(result["headers"])
+    return result
+
+def run_resources(target, timeout):
+    import asyncio
+    from check_specific_resources import COMMON_RESOURCES, check_resources_async
+    resources = asyncio.run(check_resources_async(_host(target), COMMON_RESOURCES, port=_port(target) or 80,
+                                                  timeout=timeout, report=False, save=False))
+    return {
+        "ok": any(resource["error"] is None for resource in resources),
+        "resources": resources,
+        "bytes": sum(resource["body_size"] for resource in resources),
+    }
+
+def run_audit(target, timeout):
+    import asyncio
+    from check_specific_resources import COMMON_RESOURCES
+    from header_audit import audit_urls, resource_urls, summarize_hosts
+    results = asyncio.run(audit_urls(resource_urls(target, COMMON_RESOURCES), timeout))
+    return {
+        "ok": any(result["error"] is None for result in results),
+        "hosts": summarize_hosts(results),
+        "resources": results,
+        "bytes": sum(result["bytes"] for result in results),
+    }
+
+def run_check(target, timeout):
+    from fetcher import fetch_and_extract
+    result = fetch_and_extract(_url(target), timeout=timeout)
+    return {
+        "ok": 200 <= result["status"] < 400,
+        "status": result["status"],
+        "final_url": result["final_url"],
+        "headers": dict(result["headers"]),
+        "transport": result["transport"],
+        "bytes": len(result["content"]),
+        "text_length": len(result["text"] or ""),
+        "timings": {"fetch": result["elapsed"], "extract": result["extract_time"]},
+        "phases": result["phases"],
+    }
+
+def run_accessibility(target, timeout):
+    from fetcher import fetch_and_extract
+    result = fetch_and_extract(_url(target), timeout=timeout, accessibility=True)
+    return {
+        "ok": 200 <= result["status"] < 400 and result["accessibility"] is not None,
+        "status": result["status"],
+        "final_url": result["final_url"],
+        "accessibility": result["accessibility"],
+        "issues": sum((result["accessibility"] or {"issues": {}})["issues"].values()),
+        "timings": {"fetch": result["elapsed"], "analyze": result["extract_time"]},
+        "error": None if result["accessibility"] is not None else "No HTML to analyze",
+    }
+
+def run_scrape(target, timeout):
+    from scrape_with_fallbacks import scrape
+    result = scrape(_url(target, "http"), timeout=timeout)
+    return {
+        "ok": result["error"] is None,
+        "strategy": result["strategy"],
+        "text_length": len(result["text"] or ""),
+        "raw_length": len(result["raw"] or ""),
+        "error": result["error"],
+    }
+
+CHECKS = {
+    "connectivity": run_connectivity,
+    "headers": run_headers,
+    "resources": run_resources,
+    "audit": run_audit,
+    "check": run_check,
+    "accessibility": run_accessibility,
+    "scrape": run_scrape,
+}
+
+# Checks whose time goes to trafilatura and lxml rather than the network
+EXTRACTING = {"check", "accessibility", "scrape"}
+# One extraction process per CPU; a single CPU gains nothing from them
+EXTRACT_WORKERS = os.cpu_count() if (os.cpu_count() or 1) > 1 else 0
+
+def run_target(check, target, timeout, budget=None):
+    """
+    Run one check and always return a JSON-serialisable record. With a
+    `budget` every probe and fallback for the target shares that many
+    seconds in total.
+    """
+    start_time = time.monotonic()
+    record = {"target": target, "check": check}
+    try:
+        with deadline(budget) if budget else contextlib.nullcontext():
+            record.update(CHECKS[check](target, timeout))
+    except Exception as e:
+        record["ok"] = False
+        record["error"] = f"{type(e).__name__}: {e}"
+    record.setdefault("error", None)
+    record["elapsed"] = time.monotonic() - start_time
+    return record
+
+def read_targets(source):
+    """Yield targets from a file or stdin, skipping blank lines and comments"""
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch(check, targets, output, jobs=16, timeout=10, budget=None, metrics=None):
+    """
+    Run `check` over `targets` with `jobs` workers and write one JSON line
+    per target to `output` as each one finishes. Returns (total, failed).
+    Progress is reported to `metrics` (a metrics.RunMetrics) if given.
+    """
+    targets = iter(targets)
+    total = failed = 0
+    pending = set()
+
+    def run(target):
+        if metrics is not None:
+            metrics.target_started()
+        return run_target(check, target, timeout, budget)
+
+    with ThreadPoolExecutor(jobs) as executor:
+        while True:
+            for target in targets:
+                pending.add(executor.submit(run, target))
+                if metrics is not None:
+                    metrics.target_queued()
+                if len(pending) >= jobs * 2:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if metrics is not None:
+                    metrics.target_finished(record)
+                total += 1
+                failed += not record["ok"]
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+    return total, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a diagnostic check over many targets and emit JSON Lines")
+    parser.add_argument("check", choices=sorted(CHECKS))
+    parser.add_argument("targets", nargs="?", default="-", help="file with one URL or domain per line, or - for stdin")
+    parser.add_argument("-o", "--output", help="write JSON Lines here instead of stdout")
+    parser.add_argument("-j", "--jobs", type=int, default=16, help="targets to run concurrently")
+    parser.add_argument("-t", "--timeout", type=float, default=10, help="timeout per request in seconds")
+    parser.add_argument("-b", "--budget", type=float, help="total seconds allowed per target across all requests")
+    parser.add_argument("-v", "--verbose", action="store_true", help="send the checks' own output to stderr")
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS,
+                        help="processes that extract text for check, accessibility and scrape "
+                             "(default one per CPU, 0 extracts on the job threads)")
+    parser.add_argument("--trace", help="write one JSON line per traced request to this file")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve live metrics on localhost at /metrics (Prometheus) and /metrics.json")
+    parser.add_argument("--metrics-file", help="append a JSON metrics snapshot to this file (- for stderr) "
+                                               "every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=5, help="seconds between snapshots")
+    parser.add_argument("--progress", action="store_true",
+                        help="print a progress line to stderr every --metrics-interval seconds")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    tracer = get_tracer()
+    trace_file = None
+    if args.trace:
+        trace_file = open(args.trace, "w", encoding="utf-8")
+        trace_lock = threading.Lock()
+
+        def write_trace(event):
+            with trace_lock:
+                trace_file.write(json.dumps(event) + "\n")
+        tracer.add_sink(write_trace)
+
+    metrics = None
+    reporters = []
+    if args.metrics_port is not None or args.metrics_file or args.progress:
+        from metrics import MetricsServer, RunMetrics, SnapshotWriter
+        metrics = RunMetrics()
+        if args.metrics_port is not None:
+            server = MetricsServer(metrics, args.metrics_port)
+            reporters.append(server.start())
+            print(f"Metrics on http://127.0.0.1:{server.port}/metrics", file=sys.stderr)
+        if args.metrics_file:
+            stream = sys.stderr if args.metrics_file == "-" else open(args.metrics_file, "a", encoding="utf-8")
+            reporters.append(SnapshotWriter(metrics, stream, args.metrics_interval).start())
+        if args.progress:
+            reporters.append(SnapshotWriter(metrics, sys.stderr, args.metrics_interval, progress=True).start())
+
+    extractors = None
+    if args.check in EXTRACTING and args.extract_workers > 0:
+        # The job threads only fetch; parsing runs in processes, clear of the
+        # GIL. Spawned, not forked, as this process is full of threads.
+        extractors = ProcessPoolExecutor(args.extract_workers, mp_context=multiprocessing.get_context("spawn"))
+        extract_memo.get_memo().executor = extractors
+
+    start_time = time.time()
+    try:
+        # The checks print progress; keep it out of the JSON stream
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stderr if args.verbose else devnull):
+            total, failed = run_batch(args.check, read_targets(args.targets), output, args.jobs, args.timeout,
+                                      args.budget, metrics)
+    finally:
+        if extractors is not None:
+            extract_memo.get_memo().executor = None
+            extractors.shutdown()
+        for reporter in reporters:
+            reporter.stop()
+            if getattr(reporter, "stream", sys.stderr) is not sys.stderr:
+                reporter.stream.close()
+        if output is not sys.stdout:
+            output.close()
+        if trace_file is not None:
+            tracer.remove_sink(write_trace)
+            trace_file.close()
+    print(f"{total} targets, {failed} failed, {time.time() - start_time:.2f}s", file=sys.stderr)
+    print(format_summary(tracer.summary()), file=sys.stderr)
+    down = [origin for origin, state in get_breaker().stats().items() if state["state"] != "closed"]
+    if down:
+        print(f"Circuit open for {len(down)} origins: {', '.join(sorted(down))}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
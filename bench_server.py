@@ -0,0 +1,193 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import ssl
+
+WORDS = ("accessible content navigation landmark heading contrast keyboard focus "
+         "screen reader label button image description language toolbar audit").split()
+
+def make_page(paragraphs=20, seed=0):
+    """An article-like HTML page; a different seed gives a different body"""
+    body = [f"<h1>Benchmark page {seed}</h1>"]
+    for index in range(paragraphs):
+        words = [WORDS[(seed + index * 7 + offset) % len(WORDS)] for offset in range(60)]
+        body.append(f"<p>{' '.join(words).capitalize()}.</p>")
+    links = "".join(f'<a href="/page?seed={seed + offset}">Page {seed + offset}</a>' for offset in range(1, 4))
+    return (f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Page {seed}</title></head>'
+            f'<body><nav>{links}</nav><main><article>{"".join(body)}</article></main></body></html>').encode("utf-8")
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints, all tunable with query parameters:
+
+    /page      article HTML (paragraphs=N, seed=N)
+    /bytes     `size` bytes of filler
+    /hang      accept the request and never answer (for `hang` seconds)
+    /nohead    like /bytes but HEAD is rejected with 405
+
+    Every endpoint accepts delay=<ms> before the response, rate=<bytes/s>
+    to throttle the body, chunked=1 for chunked encoding and close=1 to
+    drop the connection afterwards.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "StandIn/1.0"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this Nagle
+        # holds the body back until the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def _respond(self, head):
+        parts = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        delay = float(params.get("delay", self.server.default_delay)) / 1000
+        if delay:
+            time.sleep(delay)
+
+        if parts.path == "/hang":
+            time.sleep(float(params.get("hang", 30)))
+            self.close_connection = True
+            return
+        if parts.path == "/nohead" and head:
+            self.send_response(405)
+            self.send_header("Allow", "GET")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if parts.path == "/page":
+            body = make_page(int(params.get("paragraphs", 20)), int(params.get("seed", 0)))
+            content_type = "text/html; charset=utf-8"
+        else:
+            body = b"x" * int(params.get("size", 2048))
+            content_type = "application/octet-stream"
+
+        range_header = self.headers.get("Range", "")
+        status = 200
+        if range_header.startswith("bytes=") and body:
+            start, _, end = range_header[6:].partition("-")
+            start, end = int(start or 0), min(int(end or len(body) - 1), len(body) - 1)
+            content_range = f"bytes {start}-{end}/{len(body)}"
+            body = body[start:end + 1]
+            status = 206
+
+        chunked = params.get("chunked") == "1"
+        close = params.get("close") == "1"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-store")
+        if status == 206:
+            self.send_header("Content-Range", content_range)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if head:
+            return
+
+        rate = float(params.get("rate", 0))
+        for offset in range(0, len(body), 16384):
+            piece = body[offset:offset + 16384]
+            if chunked:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+            else:
+                self.wfile.write(piece)
+            if rate:
+                time.sleep(len(piece) / rate)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The concurrent benchmarks open connections faster than a backlog of 5
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading early (byte caps, timeouts) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class StandInServer:
+    """
+    Local HTTP or HTTPS stand-in for customer sites, run on a background
+    thread. With `https` a throwaway self-signed certificate for localhost
+    and 127.0.0.1 is generated with the openssl CLI; `certfile` is its path
+    for clients that need to trust it.
+    """
+
+    def __init__(self, port=0, https=False, default_delay=0):
+        self.server = _Server(("127.0.0.1", port), StandInHandler)
+        self.server.default_delay = default_delay
+        self.https = https
+        self.certfile = None
+        self._tempdir = None
+        if https:
+            self._tempdir = tempfile.TemporaryDirectory()
+            self.certfile = os.path.join(self._tempdir.name, "cert.pem")
+            keyfile = os.path.join(self._tempdir.name, "key.pem")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                 "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                 "-keyout", keyfile, "-out", self.certfile],
+                check=True, capture_output=True,
+            )
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certfile, keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        return f"{'https' if self.https else 'http'}://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == "__main__":
+    port = 8080 if len(sys.argv) < 2 else int(sys.argv[1])
+    server = StandInServer(port, https="--https" in sys.argv).start()
+    print(f"Stand-in server on {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from bench_server import StandInServer, make_page
+from tracing import Histogram
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def measure(name, mode, call, calls, concurrency=1):
+    """
+    Run `call(index)` `calls` times, one at a time or from `concurrency`
+    threads, and return a result row. `call` returns a truthy value on
+    success; exceptions count as errors too.
+    """
+    latencies = Histogram()
+    errors = 0
+
+    def timed(index):
+        start_time = time.monotonic()
+        try:
+            ok = call(index)
+        except Exception:
+            ok = False
+        return time.monotonic() - start_time, ok
+
+    cpu_start = time.process_time()
+    start_time = time.monotonic()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(timed, range(calls)))
+    else:
+        outcomes = [timed(index) for index in range(calls)]
+    wall = time.monotonic() - start_time
+    for latency, ok in outcomes:
+        latencies.observe(latency)
+        errors += not ok
+    return row(name, mode, calls, errors, wall, time.process_time() - cpu_start, latencies)
+
+def row(name, mode, calls, errors, wall, cpu, latencies):
+    stats = latencies.to_dict()
+    return {
+        "benchmark": name,
+        "mode": mode,
+        "calls": calls,
+        "errors": errors,
+        "wall": wall,
+        "rps": calls / wall if wall else None,
+        "p50": stats["p50"],
+        "p95": stats["p95"],
+        "p99": stats["p99"],
+        "cpu": cpu,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_tcp(server, options):
+    from check_connectivity import check_tcp_connection
+    call = lambda index: check_tcp_connection("127.0.0.1", server.port, timeout=options.timeout)
+    yield measure("tcp", "serial", call, options.requests)
+    yield measure("tcp", "threads", call, options.requests, options.concurrency)
+
+def bench_headers(server, options):
+    from check_headers import get_headers
+    path = f"/page?delay={options.delay}"
+    call = lambda index: get_headers("127.0.0.1", server.port, server.https, path, options.timeout)
+    yield measure("headers", "serial", call, options.requests)
+    yield measure("headers", "threads", call, options.requests, options.concurrency)
+
+def bench_resources(server, options):
+    from check_specific_resources import check_resource, check_resources_async
+    if server.https:
+        # The resource checker speaks plain HTTP only
+        return
+    paths = [f"/bytes?size={options.size}&delay={options.delay}&n={index}" for index in range(options.requests)]
+    call = lambda index: check_resource("127.0.0.1", paths[index], server.port, options.timeout)["error"] is None
+    yield measure("resources", "serial", call, options.requests)
+
+    latencies = Histogram()
+    cpu_start = time.process_time()
+    start_time = time.monotonic()
+    results = asyncio.run(check_resources_async("127.0.0.1", paths, server.port, options.timeout,
+                                                concurrency=options.concurrency))
+    wall = time.monotonic() - start_time
+    for result in results:
+        latencies.observe(result["timings"]["total"])
+    errors = sum(result["error"] is not None for result in results)
+    yield row("resources", "async", len(results), errors, wall, time.process_time() - cpu_start, latencies)
+
+def bench_responses(server, options):
+    """
+    The stand-in's awkward responses: chunked and throttled bodies, no
+    keep-alive, a rejected HEAD, and a server that never answers
+    """
+    from circuit_breaker import CircuitOpen
+    from header_audit import audit_url
+    from http_pool import get_pool
+    from timeouts import deadline
+
+    def fetch(query):
+        path = f"/bytes?size={options.size}&delay={options.delay}&{query}"
+        response = get_pool().request("GET", "127.0.0.1", path, server.port, urlsplit(server.url).scheme,
+                                      timeout=options.timeout)
+        return response.status == 200 and len(response.body) == options.size
+
+    yield measure("responses", "chunked", lambda index: fetch("chunked=1"), options.requests)
+    # About 50ms to send each body
+    yield measure("responses", "throttled", lambda index: fetch(f"rate={options.size * 20}"), options.requests)
+    yield measure("responses", "close", lambda index: fetch("close=1"), options.requests)
+    yield measure("responses", "nohead",
+                  lambda index: audit_url(f"{server.url}/nohead?size={options.size}&delay={options.delay}",
+                                          options.timeout)["method"] == "GET range", options.requests)
+
+    # A server of its own, since the timeouts open its circuit: the first
+    # calls time out and the rest are turned away at once
+    with StandInServer() as hanging:
+        def hang(index):
+            try:
+                with deadline(0.2):
+                    get_pool().request("GET", "127.0.0.1", "/hang?hang=1", hanging.port, timeout=options.timeout)
+            except (TimeoutError, CircuitOpen):
+                return True
+            return False
+        yield measure("responses", "hang", hang, max(options.requests // 5, 3))
+
+def bench_check(server, options):
+    from website_checker import check_website
+
+    def call(index):
+        return check_website(f"{server.url}/page?seed={index}&delay={options.delay}")
+    yield measure("check", "serial", call, options.requests)
+    yield measure("check", "threads", lambda index: call(options.requests + index),
+                  options.requests, options.concurrency)
+
+def bench_scrape(server, options):
+    from scrape_with_fallbacks import scrape_with_fallbacks
+
+    def call(index):
+        text = scrape_with_fallbacks(f"{server.url}/page?seed={index}&delay={options.delay}", timeout=options.timeout)
+        return text != "Failed to fetch content from the website."
+    yield measure("scrape", "serial", call, options.requests)
+    yield measure("scrape", "threads", lambda index: call(options.requests + index),
+                  options.requests, options.concurrency)
+
+def bench_extract(server, options):
+    from accessibility import analyze_page
+    from extract_pipeline import extract_text
+    pages = [make_page(seed=index).decode("utf-8") for index in range(options.requests)]
+    modes = {
+        "cpu": extract_text,
+        # Extraction plus the accessibility report from the same parse
+        "a11y": lambda page: analyze_page(page)[0],
+    }
+    for mode, extract in modes.items():
+        cpu_times = Histogram()
+        cpu_start = time.process_time()
+        start_time = time.monotonic()
+        errors = 0
+        for page in pages:
+            page_start = time.process_time()
+            errors += not extract(page)
+            cpu_times.observe(time.process_time() - page_start)
+        # Latencies here are CPU seconds per page rather than wall time
+        yield row("extract", mode, len(pages), errors, time.monotonic() - start_time,
+                  time.process_time() - cpu_start, cpu_times)
+
+def bench_startup(server, options):
+    """
+    Whole cli.py runs, each in a fresh interpreter the way monitoring hooks
+    start them, so interpreter start-up and imports are part of every
+    call. "python" is the bare interpreter for comparison.
+    """
+    target = f"127.0.0.1:{server.port}"
+    url = f"{server.url}/page?delay={options.delay}"
+    commands = {
+        "python": ["-c", "pass"],
+        "connectivity": [CLI, "connectivity", target],
+        "headers": [CLI, "headers", url],
+        "resources": [CLI, "resources", target],
+        "audit": [CLI, "audit", server.url],
+        "check": [CLI, "check", url],
+    }
+    if server.https:
+        del commands["resources"]
+    calls = max(options.requests // 5, 3)
+    for mode, arguments in commands.items():
+        if arguments[0] == CLI:
+            arguments = arguments + ["-t", str(options.timeout)]
+        call = lambda index, arguments=arguments: subprocess.run(
+            [sys.executable] + arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        yield measure("startup", mode, call, calls)
+
+BENCHMARKS = {
+    "tcp": bench_tcp,
+    "headers": bench_headers,
+    "resources": bench_resources,
+    "responses": bench_responses,
+    "check": bench_check,
+    "scrape": bench_scrape,
+    "extract": bench_extract,
+    "startup": bench_startup,
+}
+
+def format_rows(rows):
+    """Render result rows as a fixed-width table, latencies in milliseconds"""
+    lines = [f"{'benchmark':<12}{'mode':<14}{'calls':>7}{'errors':>8}{'req/s':>10}"
+             f"{'p50':>9}{'p95':>9}{'p99':>9}{'cpu s':>9}{'rss MB':>9}"]
+    for result in rows:
+        cells = "".join(f"{(result[key] or 0) * 1000:>9.1f}" for key in ("p50", "p95", "p99"))
+        lines.append(f"{result['benchmark']:<12}{result['mode']:<14}{result['calls']:>7}{result['errors']:>8}"
+                     f"{result['rps'] or 0:>10.1f}{cells}{result['cpu']:>9.2f}{result['peak_rss_mb']:>9.1f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the diagnostic checks against a local stand-in server")
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("-n", "--requests", type=int, default=50, help="calls per benchmark and mode")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="workers for the concurrent modes")
+    parser.add_argument("-d", "--delay", type=int, default=20, help="server latency per response in ms")
+    parser.add_argument("-s", "--size", type=int, default=16384, help="body size for the resource checks")
+    parser.add_argument("-t", "--timeout", type=float, default=10, help="timeout per request in seconds")
+    parser.add_argument("--https", action="store_true", help="serve over TLS with a throwaway certificate")
+    parser.add_argument("--json", help="also write the result rows to this file")
+    args = parser.parse_args(argv)
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    # Keep response dumps, caches and strategy memory out of the working tree
+    workdir = tempfile.TemporaryDirectory()
+    json_path = os.path.abspath(args.json) if args.json else None
+    original_cwd = os.getcwd()
+    os.chdir(workdir.name)
+    os.environ["HTTP_CACHE_DIR"] = os.path.join(workdir.name, "http_cache")
+    os.environ["STRATEGY_MEMORY_FILE"] = os.path.join(workdir.name, "strategy_winners.json")
+    os.environ["RESULT_STORE_DIR"] = os.path.join(workdir.name, "results")
+    os.environ.pop("EXTRACT_MEMO_DIR", None)
+
+    rows = []
+    with StandInServer(https=args.https) as server:
+        if server.certfile:
+            # Trust the throwaway certificate in ssl and in requests
+            os.environ["SSL_CERT_FILE"] = server.certfile
+            os.environ["REQUESTS_CA_BUNDLE"] = server.certfile
+        print(f"Stand-in server on {server.url}, {args.delay}ms latency", file=sys.stderr)
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            # The checks print progress for every call; keep it out of the timings
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                rows.extend(BENCHMARKS[name](server, args))
+
+    print(format_rows(rows))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    os.chdir(original_cwd)
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from extract_memo import body_key
+
+def text_key(text):
+    """Fingerprint of extracted text (None for pages with no text)"""
+    if text is None:
+        return None
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).hexdigest()
+
+class ChangeIndex:
+    """
+    SQLite index of every page seen by earlier runs.
+
+    For each URL it keeps the ETag and Last-Modified to revalidate with, a
+    fingerprint of the body and of the extracted text, and the text and
+    outgoing links themselves (zlib-compressed) so that an unchanged page
+    needs neither extraction nor link parsing. Each run is scoped (usually
+    to a site); finish_run() reports pages as new, changed (the extracted
+    text differs), unchanged, or gone (answered 404 or 410, or no longer
+    reached by a complete crawl).
+    """
+
+    def __init__(self, path=".change_index.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                text_hash TEXT,
+                text BLOB,
+                links BLOB,
+                state TEXT NOT NULL,
+                run INTEGER NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                last_changed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_scope ON pages (scope, run);
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                started REAL NOT NULL,
+                finished REAL,
+                summary TEXT
+            );
+        """)
+
+    def start_run(self, scope):
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO runs (scope, started) VALUES (?, ?)", (scope, time.time()))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def lookup(self, url):
+        """Return the stored row for `url` as a dict, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, body_hash, text_hash, state FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or row[4] == "gone":
+            return None
+        return dict(zip(("etag", "last_modified", "body_hash", "text_hash", "state"), row))
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since for revalidating `url`"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def unchanged(self, run, url, body=None):
+        """
+        If `url` is known and `body` is None (a 304) or has the stored
+        fingerprint, mark it unchanged in `run` and return (text, links).
+        Otherwise return None and the caller extracts as usual.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body_hash, text, links, state FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or row[3] == "gone":
+                return None
+            if body is not None and body_key(body) != row[0]:
+                return None
+            self._db.execute("UPDATE pages SET state = 'unchanged', run = ?, last_seen = ? WHERE url = ?",
+                             (run, time.time(), url))
+            self._db.commit()
+        text = zlib.decompress(row[1]).decode("utf-8") if row[1] is not None else None
+        return text, json.loads(zlib.decompress(row[2])) if row[2] is not None else []
+
+    def record(self, run, scope, url, headers, body, text, links=()):
+        """Store a freshly extracted page and return "new", "changed" or "unchanged" """
+        now = time.time()
+        new_text_hash = text_key(text)
+        compressed_text = zlib.compress(text.encode("utf-8")) if text is not None else None
+        compressed_links = zlib.compress(json.dumps(list(links)).encode("utf-8"))
+        with self._lock:
+            row = self._db.execute("SELECT text_hash, state, last_changed FROM pages WHERE url = ?",
+                                   (url,)).fetchone()
+            if row is None or row[1] == "gone":
+                state, last_changed = "new", now
+            elif row[0] != new_text_hash:
+                state, last_changed = "changed", now
+            else:
+                # The markup moved but the content did not
+                state, last_changed = "unchanged", row[2]
+            self._db.execute(
+                "INSERT INTO pages (url, scope, etag, last_modified, body_hash, text_hash, text, links, state, run,"
+                " first_seen, last_seen, last_changed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (url) DO UPDATE SET scope = excluded.scope, etag = excluded.etag,"
+                " last_modified = excluded.last_modified, body_hash = excluded.body_hash,"
+                " text_hash = excluded.text_hash, text = excluded.text, links = excluded.links,"
+                " state = excluded.state, run = excluded.run, last_seen = excluded.last_seen,"
+                " last_changed = excluded.last_changed",
+                (url, scope, headers.get("etag"), headers.get("last-modified"), body_key(body), new_text_hash,
+                 compressed_text, compressed_links, state, run, now, now, last_changed),
+            )
+            self._db.commit()
+        return state
+
+    def gone(self, run, url):
+        """Mark a known `url` gone in `run`, after a 404 or 410"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET state = 'gone', run = ?, last_seen = ?, last_changed = ?"
+                             " WHERE url = ? AND state != 'gone'", (run, now, now, url))
+            self._db.commit()
+
+    def finish_run(self, run, complete=False, keep=()):
+        """
+        Return {"new": [urls], "changed": [urls], "gone": [urls], "unchanged": count}
+        for `run`. Only a `complete` crawl (not cut short by a page cap or
+        dropped links) shows that pages it did not reach are no longer
+        linked, so only then are they marked gone too, except for the URLs
+        in `keep` (reached but failed). Otherwise unseen pages keep their
+        state.
+        """
+        with self._lock:
+            if complete:
+                scope = self._db.execute("SELECT scope FROM runs WHERE id = ?", (run,)).fetchone()[0]
+                keep = set(keep)
+                unseen = [url for (url,) in self._db.execute(
+                    "SELECT url FROM pages WHERE scope = ? AND run < ? AND state != 'gone'", (scope, run))
+                    if url not in keep]
+                self._db.executemany("UPDATE pages SET state = 'gone', run = ?, last_changed = ? WHERE url = ?",
+                                     [(run, time.time(), url) for url in unseen])
+            summary = {"new": [], "changed": [], "gone": [], "unchanged": 0}
+            for url, state in self._db.execute("SELECT url, state FROM pages WHERE run = ?", (run,)):
+                if state == "unchanged":
+                    summary["unchanged"] += 1
+                else:
+                    summary[state].append(url)
+            self._db.execute("UPDATE runs SET finished = ?, summary = ? WHERE id = ?",
+                             (time.time(), json.dumps({name: value if isinstance(value, int) else len(value)
+                                                       for name, value in summary.items()}), run))
+            self._db.commit()
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def format_changes(summary):
+    """One line of counts followed by the new, changed and gone URLs"""
+    lines = [f"{len(summary['new'])} new, {len(summary['changed'])} changed, "
+             f"{summary['unchanged']} unchanged, {len(summary['gone'])} gone"]
+    for state in ("new", "changed", "gone"):
+        lines.extend(f"  {state:<8}{url}" for url in summary[state])
+    return "\n".join(lines)
@@ -1,15 +1,24 @@
+import asyncio
+import errno
 import socket
 import time
 import sys
-import dns.resolver
+
+from circuit_breaker import CircuitOpen, get_breaker, origin_key
+from dns_cache import get_resolver
+from timeouts import DeadlineExceeded, timeout_for
+from tracing import get_tracer
 
 def check_dns(domain):
     print(f"Checking DNS resolution for {domain}...")
     try:
-        answers = dns.resolver.resolve(domain, 'A')
+        addresses = get_resolver().resolve(domain)
         print(f"DNS resolved to the following IP addresses:")
-        for rdata in answers:
-            print(f"  {rdata}")
+        for _, address in addresses:
+            print(f"  {address}")
+        ttl = get_resolver().ttl_remaining(domain)
+        if ttl is not None:
+            print(f"Cached for {ttl:.0f}s")
         return True
     except Exception as e:
         print(f"DNS resolution failed: {e}")
@@ -17,34 +26,65 @@ def check_dns(domain):
 
 def check_tcp_connection(domain, port=80, timeout=2):
     print(f"Checking TCP connection to {domain}:{port} with {timeout}s timeout...")
+    breaker = get_breaker()
+    key = origin_key(domain, port, "tcp")
+    try:
+        breaker.before(key)
+    except CircuitOpen as e:
+        print(f"Skipping: {e}")
+        return False
     start_time = time.time()
+    trace = get_tracer().start("tcp", f"{domain}:{port}", domain)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
-        # Get IP address
+        # Get IP address from the shared resolver cache
         try:
-            ip = socket.gethostbyname(domain)
+            family, ip = get_resolver().resolve(domain)[0]
+            trace.mark("dns")
             print(f"Resolved {domain} to {ip}")
         except socket.gaierror as e:
             print(f"Could not resolve hostname: {e}")
+            breaker.failure(key)
+            trace.finish(e)
             return False
+        
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout_for(domain, "connect", timeout))
             
         # Try to connect
         result = sock.connect_ex((ip, port))
         elapsed = time.time() - start_time
         
         if result == 0:
+            trace.mark("connect")
+            breaker.success(key)
+            trace.finish()
             print(f"Successfully connected to {domain}:{port} in {elapsed:.2f}s")
+            print(f"  DNS {trace.durations()['dns'] * 1000:.1f}ms, connect {trace.durations()['connect'] * 1000:.1f}ms")
             return True
         else:
+            if result == errno.ECONNREFUSED:
+                # The host answered, there is just nothing on this port
+                breaker.release(key)
+            else:
+                breaker.failure(key)
+            trace.finish(f"error code {result}")
             print(f"Failed to connect, error code: {result} ({elapsed:.2f}s)")
             return False
-    except socket.timeout:
+    except DeadlineExceeded as e:
+        # The budget ran out, which says nothing about the host
+        breaker.release(key)
+        trace.finish(e)
+        print(f"Skipped: {e}")
+        return False
+    except socket.timeout as e:
+        breaker.failure(key)
+        trace.finish(e)
         elapsed = time.time() - start_time
         print(f"Connection timed out after {elapsed:.2f}s")
         return False
     except Exception as e:
+        breaker.release(key)
+        trace.finish(e)
         elapsed = time.time() - start_time
         print(f"Error connecting: {type(e).__name__}: {e} ({elapsed:.2f}s)")
         return False
@@ -54,7 +94,89 @@ def check_tcp_connection(domain, port=80, timeout=2):
         except:
             pass
 
+async def _connect_address(domain, family, address, port, timeout, global_slots, host_slots):
+    result = {
+        "domain": domain,
+        "port": port,
+        "address": address,
+        "family": "IPv6" if family == socket.AF_INET6 else "IPv4",
+        "connected": False,
+        "latency": None,
+        "error": None,
+    }
+    breaker = get_breaker()
+    key = origin_key(domain, port, "tcp")
+    async with global_slots, host_slots:
+        trace = get_tracer().start("tcp", f"{domain}:{port}", domain)
+        try:
+            breaker.before(key)
+            connect_timeout = timeout_for(domain, "connect", timeout)
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), connect_timeout)
+            trace.mark("connect")
+            result["latency"] = trace.marks["connect"]
+            result["connected"] = True
+            breaker.success(key)
+            writer.close()
+        except CircuitOpen as e:
+            result["error"] = str(e)
+        except DeadlineExceeded as e:
+            breaker.release(key)
+            result["error"] = str(e)
+        except asyncio.TimeoutError:
+            breaker.failure(key)
+            result["error"] = f"Timed out after {connect_timeout:.2f}s"
+        except OSError as e:
+            # A refused port still proves the host is up
+            breaker.release(key)
+            result["error"] = f"{type(e).__name__}: {e}"
+        trace.finish(result["error"])
+    return result
+
+async def scan_connectivity(domains, ports=(80, 443), timeout=2, concurrency=200, per_host=4):
+    """
+    TCP connect check for every A/AAAA address of every domain on every port.
+
+    At most `concurrency` connects are in flight overall and `per_host` per
+    domain. Returns one result dict per (domain, address, port), with the
+    connect latency in seconds, plus one per domain that failed to resolve.
+    """
+    resolver = get_resolver()
+    resolved = await asyncio.to_thread(resolver.prefetch, domains)
+    global_slots = asyncio.Semaphore(concurrency)
+    results = []
+    tasks = []
+    for domain in dict.fromkeys(domains):
+        addresses = resolved[domain]
+        if isinstance(addresses, Exception):
+            results.append({"domain": domain, "port": None, "address": None, "family": None,
+                            "connected": False, "latency": None,
+                            "error": f"DNS resolution failed: {addresses}"})
+            continue
+        host_slots = asyncio.Semaphore(per_host)
+        for family, address in addresses:
+            for port in ports:
+                tasks.append(_connect_address(domain, family, address, port, timeout,
+                                              global_slots, host_slots))
+    results.extend(await asyncio.gather(*tasks))
+    return results
+
+def print_scan_results(results):
+    for result in results:
+        target = f"{result['domain']} {result['address'] or '-'}:{result['port'] or '-'}"
+        if result["connected"]:
+            print(f"{target} connected in {result['latency'] * 1000:.1f}ms")
+        else:
+            print(f"{target} failed: {result['error']}")
+
 if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        # Several domains: scan them all concurrently
+        start_time = time.time()
+        results = asyncio.run(scan_connectivity(sys.argv[1:]))
+        print_scan_results(results)
+        print(f"Scanned {len(results)} addresses in {time.time() - start_time:.2f}s")
+        sys.exit(0)
+    
     domain = "heaventree10.com" if len(sys.argv) < 2 else sys.argv[1]
     
     # First try a well-known site
@@ -1,45 +1,57 @@
-import http.client
 import socket
-import ssl
 import sys
 
-def get_headers(host, port=443, use_ssl=True, path="/", timeout=5):
-    print(f"Connecting to {host}:{port} (SSL: {use_ssl})...")
-    
+from http_pool import get_pool
+
+def head_request(host, port=443, use_ssl=True, path="/", timeout=5):
+    """Send a HEAD request over the pool and return a result dict"""
+    result = {
+        "host": host,
+        "port": port,
+        "ssl": use_ssl,
+        "path": path,
+        "status": None,
+        "reason": "",
+        "headers": [],
+        "reused": False,
+        "tls_resumed": False,
+        "timings": {},
+        "error": None,
+    }
     try:
-        if use_ssl:
-            context = ssl.create_default_context()
-            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=context)
-        else:
-            conn = http.client.HTTPConnection(host, port, timeout=timeout)
-            
-        print(f"Sending HEAD request for {path}...")
-        conn.request("HEAD", path)
-        
-        print("Waiting for response...")
-        response = conn.getresponse()
-        
-        print(f"Response status: {response.status} {response.reason}")
-        print("Headers:")
-        for header, value in response.getheaders():
-            print(f"  {header}: {value}")
-            
-        return True
-        
+        scheme = "https" if use_ssl else "http"
+        response = get_pool().request("HEAD", host, path, port=port, scheme=scheme, timeout=timeout)
+        result["status"] = response.status
+        result["reason"] = response.reason
+        result["headers"] = response.header_list
+        result["reused"] = response.reused
+        result["tls_resumed"] = response.tls_resumed
+        result["timings"] = response.timings
     except socket.timeout:
-        print("Connection timed out")
-        return False
+        result["error"] = "Connection timed out"
     except ConnectionRefusedError:
-        print("Connection refused")
-        return False
+        result["error"] = "Connection refused"
     except Exception as e:
-        print(f"Error: {type(e).__name__}: {e}")
+        result["error"] = f"Error: {type(e).__name__}: {e}"
+    return result
+
+def get_headers(host, port=443, use_ssl=True, path="/", timeout=5):
+    print(f"Connecting to {host}:{port} (SSL: {use_ssl})...")
+    print(f"Sending HEAD request for {path}...")
+    result = head_request(host, port, use_ssl, path, timeout)
+    if result["error"]:
+        print(result["error"])
         return False
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
+    
+    if result["reused"]:
+        print("Reused a pooled keep-alive connection")
+    elif result["tls_resumed"]:
+        print("Resumed the previous TLS session")
+    print(f"Response status: {result['status']} {result['reason']}")
+    print("Headers:")
+    for header, value in result["headers"]:
+        print(f"  {header}: {value}")
+    return True
 
 if __name__ == "__main__":
     domain = "heaventree10.com" if len(sys.argv) < 2 else sys.argv[1]
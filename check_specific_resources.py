@@ -1,114 +1,130 @@
+import asyncio
 import socket
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-def check_resource(domain, resource_path="/", port=80, timeout=2):
+from http_pool import get_pool
+from result_store import get_store
+from timeouts import propagate
+
+# Common resources to try on every site
+COMMON_RESOURCES = [
+    "/",                     # Root
+    "/favicon.ico",          # Favicon
+    "/robots.txt",           # Robots
+    "/sitemap.xml",          # Sitemap
+    "/wp-content/",          # WordPress content
+    "/images/",              # Common image folder
+    "/assets/",              # Common assets folder
+    "/api/",                 # API endpoint
+    "/css/style.css",        # CSS file
+    "/js/main.js"            # JavaScript file
+]
+
+def probe_resource(domain, resource_path="/", port=80, timeout=2, save=True):
     """
-    Try to fetch a specific resource from the domain
+    Fetch a specific resource over a pooled keep-alive connection and
+    return a result dict. The raw response is streamed into the result
+    store (or just counted when `save` is false) and never held in memory;
+    `record` is its id in the store.
     """
-    print(f"Checking resource {domain}:{port}{resource_path}")
-    
+    result = {
+        "domain": domain,
+        "port": port,
+        "path": resource_path,
+        "status": None,
+        "status_line": "",
+        "headers": {},
+        "body_size": 0,
+        "record": None,
+        "reused": False,
+        "timings": {},
+        "error": None,
+    }
+    start_time = time.monotonic()
     try:
-        # Create socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(timeout)
-        
-        # Connect
-        s.connect((domain, port))
-        
-        # Send HTTP request
-        request = f"GET {resource_path} HTTP/1.1\r\nHost: {domain}\r\nUser-Agent: Mozilla/5.0\r\nAccept: */*\r\nConnection: close\r\n\r\n"
-        s.sendall(request.encode())
-        
-        # Receive response
-        start_time = time.time()
-        max_time = 3  # Maximum 3 seconds
-        chunks = []
-        
-        print("Receiving data...")
-        while time.time() - start_time < max_time:
-            try:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                chunks.append(chunk)
-            except socket.timeout:
-                print("Socket receive timed out")
-                break
-        
-        # Process response
-        response_data = b''.join(chunks)
-        if response_data:
-            # Try to decode to utf-8, falling back to latin-1
-            try:
-                response_text = response_data.decode('utf-8')
-            except UnicodeDecodeError:
-                response_text = response_data.decode('latin-1', errors='replace')
-                
-            # Determine if it's a binary file
-            is_binary = False
-            content_type = ""
-            
-            # Extract HTTP status code
-            status_line = response_text.split('\r\n')[0]
-            print(f"Status: {status_line}")
-            
-            # Extract Content-Type if present
-            for line in response_text.split('\r\n'):
-                if line.lower().startswith('content-type:'):
-                    content_type = line
-                    print(f"Content-Type: {line}")
-                    if 'image/' in line or 'application/' in line:
-                        is_binary = True
-            
-            # Determine content length
-            headers_end = response_text.find('\r\n\r\n')
-            if headers_end > 0:
-                body = response_text[headers_end+4:]
-                print(f"Body length: {len(body)} characters")
-                
-                # Save file depending on binary status
-                filename = f"response_{resource_path.replace('/', '_')}"
-                if filename == "response__":
-                    filename = "response_root"
-                
-                with open(f"{filename}.txt", "w", encoding="utf-8") as f:
-                    f.write(response_text)
-                print(f"Saved response to {filename}.txt")
-            
-        else:
-            print("No data received")
-            
+        with get_pool().stream("GET", domain, resource_path, port=port, timeout=timeout) as response:
+            result["status"] = response.status
+            result["status_line"] = response.status_line
+            result["headers"] = response.headers
+            result["reused"] = response.reused
+            if save:
+                with get_store().writer(domain, port, resource_path, response.status,
+                                        response.raw_head()) as writer:
+                    for chunk in response.iter_body():
+                        writer.write(chunk)
+                result["record"] = writer.record
+            else:
+                response.drain()
+            result["body_size"] = response.body_size
+        result["timings"].update(response.timings)
     except socket.timeout:
-        print(f"Connection to {domain}:{port} timed out")
+        result["error"] = f"Connection to {domain}:{port} timed out"
     except ConnectionRefusedError:
-        print(f"Connection to {domain}:{port} refused")
+        result["error"] = f"Connection to {domain}:{port} refused"
     except Exception as e:
-        print(f"Error: {type(e).__name__}: {e}")
-    finally:
-        try:
-            s.close()
-        except:
-            pass
-    
+        result["error"] = f"Error: {type(e).__name__}: {e}"
+    result["timings"]["total"] = time.monotonic() - start_time
+    return result
+
+def check_resource(domain, resource_path="/", port=80, timeout=2):
+    """
+    Try to fetch a specific resource from the domain
+    """
+    result = probe_resource(domain, resource_path, port, timeout)
+    print_resource_result(result)
+    return result
+
+def print_resource_result(result):
+    """Print a probe result in the same format as check_resource()"""
+    print(f"Checking resource {result['domain']}:{result['port']}{result['path']}")
+    if result["status_line"]:
+        print(f"Status: {result['status_line']}")
+        content_type = result["headers"].get("content-type")
+        if content_type is not None:
+            print(f"Content-Type: {content_type}")
+        print(f"Body length: {result['body_size']} bytes")
+        if result["record"]:
+            print(f"Stored response as record {result['record']}")
+    if result["error"]:
+        print(result["error"])
+    elif not result["status_line"]:
+        print("No data received")
+    print(f"Finished in {result['timings']['total']:.2f}s")
     print("")  # Empty line for readability
 
+async def check_resources_async(domain, paths, port=80, timeout=2, concurrency=6, report=True, save=True):
+    """
+    Probe many resources on one host concurrently.
+
+    At most `concurrency` requests are in flight to the host at once, each on
+    a keep-alive connection from the shared pool and a thread of an executor
+    of that size (the default executor would cap it at a few dozen). Results
+    are returned in the order of `paths`; when `report` is true each one is
+    printed as soon as it completes, and with `save` each response is added
+    to the result store.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+
+    def probe(path):
+        # Like to_thread, run in the caller's context so that deadlines apply
+        return loop.run_in_executor(executor, propagate(probe_resource), domain, path, port, timeout, save)
+
+    try:
+        tasks = [probe(path) for path in paths]
+        if report:
+            for next_done in asyncio.as_completed(tasks):
+                print_resource_result(await next_done)
+        return list(await asyncio.gather(*tasks))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 if __name__ == "__main__":
     domain = "heaventree10.com" if len(sys.argv) < 2 else sys.argv[1]
     
-    # Try different common resources
-    resources = [
-        "/",                     # Root
-        "/favicon.ico",          # Favicon
-        "/robots.txt",           # Robots
-        "/sitemap.xml",          # Sitemap
-        "/wp-content/",          # WordPress content
-        "/images/",              # Common image folder
-        "/assets/",              # Common assets folder
-        "/api/",                 # API endpoint
-        "/css/style.css",        # CSS file
-        "/js/main.js"            # JavaScript file
-    ]
-    
-    for resource in resources:
-        check_resource(domain, resource)
\ No newline at end of file
+    # Probe all resources at once instead of one after another
+    start_time = time.time()
+    asyncio.run(check_resources_async(domain, COMMON_RESOURCES))
+    print(f"Checked {len(COMMON_RESOURCES)} resources in {time.time() - start_time:.2f}s")
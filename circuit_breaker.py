@@ -0,0 +1,179 @@
+import random
+import socket
+import ssl
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from timeouts import DeadlineExceeded, remaining
+
+class CircuitOpen(ConnectionError):
+    """The host failed repeatedly and is not being contacted for now"""
+
+class _HostState:
+    def __init__(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.reset_timeout = 0.0
+        self.probing = False
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every fetch path, with one circuit per
+    origin key (see origin_key), so a dead port never blocks the others.
+
+    After `failure_threshold` consecutive transient failures an origin's
+    circuit opens and every request to it fails fast with CircuitOpen.
+    After `reset_timeout` seconds it goes half-open: one probe request is
+    let through while the rest keep failing fast. A successful probe closes
+    the circuit; a failed one opens it again for twice as long, up to
+    `max_reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=15, max_reset_timeout=300):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState()
+        return state
+
+    def before(self, host):
+        """Raise CircuitOpen unless a request to `host` may go ahead"""
+        with self._lock:
+            state = self._host(host)
+            if state.state == "closed":
+                return
+            if state.state == "open":
+                wait = state.opened_at + state.reset_timeout - time.monotonic()
+                if wait > 0:
+                    raise CircuitOpen(f"{host} is down, retrying in {wait:.0f}s")
+                state.state = "half-open"
+            if state.probing:
+                raise CircuitOpen(f"{host} is down, waiting for a probe")
+            state.probing = True
+
+    def success(self, host):
+        with self._lock:
+            state = self._host(host)
+            state.state = "closed"
+            state.failures = 0
+            state.probing = False
+
+    def failure(self, host):
+        with self._lock:
+            state = self._host(host)
+            state.failures += 1
+            if state.state == "half-open":
+                state.reset_timeout = min(state.reset_timeout * 2, self.max_reset_timeout)
+            elif state.failures >= self.failure_threshold:
+                state.reset_timeout = self.reset_timeout
+            else:
+                return
+            state.state = "open"
+            state.opened_at = time.monotonic()
+            state.probing = False
+
+    def release(self, host):
+        """End a half-open probe that told nothing about the host's health"""
+        with self._lock:
+            self._host(host).probing = False
+
+    def state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            return "closed" if state is None else state.state
+
+    def stats(self):
+        with self._lock:
+            return {host: {"state": state.state, "failures": state.failures}
+                    for host, state in self._hosts.items() if state.failures}
+
+def origin_key(host, port=None, scheme="http"):
+    """Breaker key for one (scheme, host, port)"""
+    if port is None:
+        port = 443 if scheme == "https" else 80
+    return f"{scheme}://{host}:{port}"
+
+def url_key(url):
+    """Breaker key for the origin of a URL"""
+    parts = urlsplit(url)
+    return origin_key(parts.hostname, parts.port, parts.scheme or "http")
+
+def _chain(error):
+    """The error and the errors it was raised from"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def is_definitive(error):
+    """
+    Answers that no retry will change: a refused connection means the host
+    is up with nothing on that port, and a TLS error will fail the same way
+    """
+    return any(isinstance(cause, (ConnectionRefusedError, ssl.SSLError)) for cause in _chain(error))
+
+def is_transient(error):
+    """Network failures that say something about the host and may be retried"""
+    if isinstance(error, (CircuitOpen, DeadlineExceeded)) or is_definitive(error):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError, socket.gaierror)):
+        return True
+    # Only code that imported requests can raise its errors
+    requests = sys.modules.get("requests")
+    if requests is None or isinstance(error, requests.exceptions.SSLError):
+        return False
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def backoff_delay(attempt, base=0.2, cap=5.0):
+    """Full-jitter exponential backoff before retry number `attempt` (from 1)"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+def with_retries(key, func, retries=2, base_delay=0.2):
+    """
+    Call `func(attempt)` through the breaker for `key` (see origin_key),
+    retrying transient failures up to `retries` times with jittered
+    backoff. The error is raised instead when the retries are used up, when the backoff would
+    overrun the current deadline, or when the failure opened the circuit.
+    Other errors, refused connections and TLS errors included, are raised
+    at once and not counted.
+    """
+    breaker = get_breaker()
+    attempt = 0
+    while True:
+        breaker.before(key)
+        try:
+            result = func(attempt)
+        except Exception as e:
+            if not is_transient(e):
+                breaker.release(key)
+                raise
+            breaker.failure(key)
+            attempt += 1
+            delay = backoff_delay(attempt, base_delay)
+            if attempt > retries or remaining(delay) < delay or breaker.state(key) == "open":
+                raise
+            time.sleep(delay)
+            continue
+        breaker.success(key)
+        return result
+
+_default_breaker = None
+_default_breaker_lock = threading.Lock()
+
+def get_breaker():
+    """Return the process-wide circuit breaker"""
+    global _default_breaker
+    with _default_breaker_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
@@ -0,0 +1,73 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Each check imports what it needs when it runs (see batch.CHECKS), so a
+# connectivity or headers check never loads requests, dnspython for IP
+# targets, or trafilatura and lxml
+from batch import CHECKS, run_target
+
+COMMAND_HELP = {
+    "connectivity": "DNS and TCP reachability on ports 80 and 443",
+    "headers": "HEAD request and response headers",
+    "resources": "fetch the common resources (robots.txt, favicon, ...) over plain HTTP",
+    "audit": "security and caching headers of the common resources, without bodies",
+    "check": "download the page and extract its text",
+    "accessibility": "accessibility issues of the page (alt text, headings, labels, ...)",
+    "scrape": "race the scrape methods and extract the page text",
+}
+
+def format_record(record):
+    """
+    One line per checked target: status, check, target, time and error,
+    followed by the issues found for the accessibility check
+    """
+    line = f"{'ok' if record['ok'] else 'FAIL':<5}{record['check']:<14}{record['target']}  {record['elapsed']:.2f}s"
+    if record["error"]:
+        line += f"  {record['error']}"
+    if record.get("accessibility"):
+        from accessibility import format_report
+        line += f"  {record['issues']} issues\n" + format_report(record["accessibility"])
+    return line
+
+def run_checks(check, targets, timeout=10, budget=None, as_json=False, verbose=False):
+    """Run `check` on each target in turn, print its record and return how many failed"""
+    failed = 0
+    for target in targets:
+        # The checks print progress; only show it with -v
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stderr if verbose else devnull):
+            record = run_target(check, target, timeout, budget)
+        failed += not record["ok"]
+        print(json.dumps(record, default=str) if as_json else format_record(record))
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Website diagnostics. Exits 0 when every target passed and 1 otherwise.")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for check in CHECKS:
+        command = commands.add_parser(check, help=COMMAND_HELP.get(check))
+        command.add_argument("targets", nargs="+", help="URLs or domains")
+        command.add_argument("-t", "--timeout", type=float, default=10, help="timeout per request in seconds")
+        command.add_argument("-b", "--budget", type=float, help="total seconds allowed per target")
+        command.add_argument("--json", action="store_true", help="print each result as a JSON line")
+        command.add_argument("-v", "--verbose", action="store_true", help="show the check's own output on stderr")
+    batch_command = commands.add_parser("batch", help="run a check over a file of targets (see batch.py -h)")
+    batch_command.add_argument("arguments", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        import batch
+        batch.main(args.arguments)
+        return 0
+    start_time = time.monotonic()
+    failed = run_checks(args.command, args.targets, args.timeout, args.budget, args.json, args.verbose)
+    if len(args.targets) > 1:
+        print(f"{len(args.targets)} targets, {failed} failed, {time.monotonic() - start_time:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
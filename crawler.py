@@ -0,0 +1,430 @@
+import asyncio
+import hashlib
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import quote, urljoin, urldefrag, urlsplit, urlunsplit
+
+import extract_memo
+from accessibility import analyze_page, summarize
+from change_index import ChangeIndex, format_changes
+from extract_pipeline import extract_text
+from http_pool import get_pool
+from http_stream import MAX_BODY_SIZE, charset
+
+class SeenSet:
+    """Compact URL set that keeps an 8-byte digest per URL instead of the string"""
+
+    def __init__(self):
+        self._digests = set()
+
+    def _key(self, url):
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, url):
+        """Add a URL and return True if it had not been seen before"""
+        key = self._key(url)
+        if key in self._digests:
+            return False
+        self._digests.add(key)
+        return True
+
+    def __contains__(self, url):
+        return self._key(url) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+# Characters left as they are when percent-encoding a path (RFC 3986 pchar
+# and "/"); "%" keeps already encoded URLs unchanged
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+
+def normalize_url(url, base=None):
+    """
+    Resolve, drop the fragment and default port, lowercase scheme and host,
+    IDNA-encode the host and percent-encode the path and query as UTF-8,
+    so that the result is plain ASCII
+    """
+    if base:
+        url = urljoin(base, url)
+    url, _ = urldefrag(url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        return None
+    host = (parts.hostname or "").lower()
+    if not host:
+        return None
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    netloc = f"[{host}]" if ":" in host else host
+    if parts.port and parts.port != (443 if scheme == "https" else 80):
+        netloc = f"{netloc}:{parts.port}"
+    path = quote(parts.path or "/", safe=PATH_SAFE)
+    query = quote(parts.query, safe=PATH_SAFE + "?")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+class LinkExtractor(HTMLParser):
+    """Collect href targets of <a> and <area> tags"""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("a", "area"):
+            for name, value in attrs:
+                if name == "href" and value:
+                    self.links.append(value)
+
+def resolve_links(hrefs, base_url):
+    """Normalized absolute URLs for raw href values, dropping unusable ones"""
+    links = []
+    for link in hrefs:
+        url = normalize_url(link, base_url)
+        if url:
+            links.append(url)
+    return links
+
+def extract_links(html, base_url):
+    parser = LinkExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    return resolve_links(parser.links, base_url)
+
+def parse_robots(text):
+    """Return (sitemap URLs, disallowed path prefixes for all user agents)"""
+    sitemaps = []
+    disallow = []
+    applies = False
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = line.split(":", 1)
+        field, value = field.strip().lower(), value.strip()
+        if field == "sitemap" and value:
+            sitemaps.append(value)
+        elif field == "user-agent":
+            applies = value == "*"
+        elif field == "disallow" and applies and value:
+            disallow.append(value)
+    return sitemaps, disallow
+
+def parse_sitemap(body):
+    """Return (page URLs, nested sitemap URLs) from a sitemap or sitemap index"""
+    pages, sitemaps = [], []
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return pages, sitemaps
+    is_index = root.tag.endswith("sitemapindex")
+    for element in root.iter():
+        if element.tag.endswith("loc") and element.text:
+            (sitemaps if is_index else pages).append(element.text.strip())
+    return pages, sitemaps
+
+def _fetch(url, timeout, max_bytes=None, headers=None):
+    """
+    Fetch a URL over the shared pool and return (status, headers, body),
+    reading at most `max_bytes` of the body
+    """
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    with get_pool().stream("GET", parts.hostname, path, port=parts.port, scheme=parts.scheme,
+                           headers=headers, timeout=timeout) as response:
+        body = response.read(max_bytes)
+    return response.status, response.headers, body
+
+class Crawler:
+    """
+    Site-wide crawler with a bounded, concurrent frontier.
+
+    /robots.txt is read (following its redirects) before anything else is
+    fetched. The frontier is seeded from the sitemaps it lists,
+    /sitemap.xml and the start URL, then grows with links found in fetched
+    HTML. URLs are deduplicated with a SeenSet; when the frontier is full
+    new links are dropped rather than blocking the workers. Each host gets
+    at most `per_host` requests in flight and `delay` seconds between
+    requests.
+    With `extract_workers` set, extraction runs in that many processes
+    instead of a thread. Only the first `max_bytes` of each page are read;
+    robots.txt and sitemaps are read in full.
+
+    With a ChangeIndex as `index`, pages are revalidated against the last
+    run and unchanged ones (304, or the same body fingerprint) reuse the
+    stored text and links instead of being parsed and extracted again.
+    Each page result gets a `change` state, and once the crawl completes
+    `changes` holds the run's summary (see ChangeIndex.finish_run).
+
+    With `accessibility` each page is parsed once with lxml for its links,
+    its accessibility report (`accessibility`, see accessibility.analyze)
+    and its extraction, instead of separately for links and extraction.
+    Pages the index reports unchanged are not analyzed again.
+    """
+
+    def __init__(self, start_url, max_pages=500, concurrency=8, per_host=2,
+                 delay=0.0, queue_size=1000, same_host=True, timeout=10,
+                 extract_workers=None, max_bytes=MAX_BODY_SIZE, index=None, accessibility=False):
+        self.start_url = normalize_url(start_url if "://" in start_url else f"http://{start_url}")
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.queue_size = queue_size
+        self.same_host = same_host
+        self.timeout = timeout
+        self.extract_workers = extract_workers
+        self.max_bytes = max_bytes
+        self.index = index
+        self.accessibility = accessibility
+        self.changes = None
+        self._run = None
+        self._extractors = None
+        self.seen = SeenSet()
+        self.disallow = []
+        self.pages_queued = 0
+        self.dropped = 0
+        # Set when pages were left out (page cap, unreadable sitemap)
+        self.incomplete = False
+        self.failed = set()
+        self._host_slots = {}
+        self._host_next = {}
+
+    def _allowed(self, url):
+        parts = urlsplit(url)
+        if self.same_host and parts.hostname != urlsplit(self.start_url).hostname:
+            return False
+        return not any(parts.path.startswith(prefix) for prefix in self.disallow)
+
+    def _enqueue(self, url, kind="page"):
+        url = normalize_url(url)
+        if not url or not self._allowed(url):
+            return
+        if url in self.seen:
+            return
+        if kind == "page" and self.pages_queued >= self.max_pages:
+            self.incomplete = True
+            return
+        try:
+            self._queue.put_nowait((url, kind))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.seen.add(url)
+        if kind == "page":
+            self.pages_queued += 1
+
+    async def _polite_fetch(self, url, max_bytes=None, headers=None):
+        host = urlsplit(url).netloc
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slots:
+            loop = asyncio.get_running_loop()
+            wait = self._host_next.get(host, 0) - loop.time()
+            self._host_next[host] = max(loop.time(), self._host_next.get(host, 0)) + self.delay
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return await asyncio.to_thread(_fetch, url, self.timeout, max_bytes, headers)
+
+    async def _extract(self, func, *args):
+        """Run `func` in the extraction processes, or in a thread without them"""
+        if self._extractors is not None:
+            return await asyncio.get_running_loop().run_in_executor(self._extractors, func, *args)
+        return await asyncio.to_thread(func, *args)
+
+    async def _process(self, url, kind):
+        start_time = time.monotonic()
+        page = {"url": url, "kind": kind, "status": None, "content_type": "",
+                "links": 0, "text": None, "accessibility": None, "change": None, "error": None}
+        try:
+            if kind == "page":
+                request_headers = self.index.conditional_headers(url) if self.index is not None else None
+                status, headers, body = await self._polite_fetch(url, self.max_bytes, request_headers)
+            else:
+                status, headers, body = await self._polite_fetch(url)
+            known = None
+            if kind == "page" and self.index is not None and status in (200, 304):
+                known = self.index.unchanged(self._run, url, body if status == 200 else None)
+            page["status"] = status
+            page["content_type"] = headers.get("content-type", "")
+            if known is not None:
+                page["text"], links = known
+                page["links"] = len(links)
+                page["change"] = "unchanged"
+                for link in links:
+                    self._enqueue(link)
+            elif 300 <= status < 400 and "location" in headers:
+                self._enqueue(urljoin(url, headers["location"]), kind)
+            elif kind == "sitemap" and status == 200:
+                pages, sitemaps = parse_sitemap(body)
+                for sitemap in sitemaps:
+                    self._enqueue(sitemap, "sitemap")
+                for page_url in pages:
+                    self._enqueue(page_url)
+            elif kind == "page" and status == 200 and "html" in page["content_type"]:
+                try:
+                    html = body.decode(charset(page["content_type"]), errors="replace")
+                except LookupError:
+                    html = body.decode("utf-8", errors="replace")
+                memo = extract_memo.get_memo()
+                memo_key = extract_memo.body_key(html)
+                found, page["text"] = memo.lookup(memo_key)
+                if self.accessibility:
+                    # One parse gives the links, the report and (unless memoized) the text
+                    text, page["accessibility"], hrefs = await self._extract(analyze_page, html, None, not found)
+                    links = resolve_links(hrefs, url)
+                    for link in links:
+                        self._enqueue(link)
+                else:
+                    links = extract_links(html, url)
+                    for link in links:
+                        self._enqueue(link)
+                    if not found:
+                        text = await self._extract(extract_text, html)
+                page["links"] = len(links)
+                if not found:
+                    page["text"] = text
+                    memo.store(memo_key, text)
+                if self.index is not None:
+                    page["change"] = self.index.record(self._run, self._scope, url, headers, body,
+                                                       page["text"], links)
+            elif kind == "page" and status in (404, 410) and self.index is not None:
+                self.index.gone(self._run, url)
+                page["change"] = "gone"
+        except Exception as e:
+            page["error"] = f"{type(e).__name__}: {e}"
+        if page["error"] is not None or page["status"] >= 500:
+            if kind == "page":
+                # Not taken for gone, the page keeps its state in the index
+                self.failed.add(url)
+            else:
+                self.incomplete = True
+        elif kind == "page" and page["status"] >= 400 and page["status"] not in (404, 410):
+            self.failed.add(url)
+        page["elapsed"] = time.monotonic() - start_time
+        return page
+
+    async def _read_robots(self, max_redirects=5):
+        """Fetch /robots.txt, following up to `max_redirects` redirects, and apply its rules"""
+        url = normalize_url(urljoin(self.start_url, "/robots.txt"))
+        for _ in range(max_redirects + 1):
+            self.seen.add(url)
+            try:
+                status, headers, body = await self._polite_fetch(url)
+            except Exception:
+                # No robots.txt to honour
+                return
+            if 300 <= status < 400 and "location" in headers:
+                url = normalize_url(headers["location"], url)
+                if url is None or url in self.seen:
+                    return
+                continue
+            if status == 200:
+                sitemaps, self.disallow = parse_robots(body.decode("utf-8", errors="replace"))
+                for sitemap in sitemaps:
+                    self._enqueue(sitemap, "sitemap")
+            return
+
+    async def _worker(self):
+        while True:
+            url, kind = await self._queue.get()
+            try:
+                page = await self._process(url, kind)
+                if kind == "page":
+                    await self._results.put(page)
+            finally:
+                self._queue.task_done()
+
+    async def run(self):
+        """Crawl the site, yielding each page result as soon as it finishes"""
+        self._queue = asyncio.Queue(self.queue_size)
+        self._results = asyncio.Queue()
+        if self.extract_workers:
+            self._extractors = ProcessPoolExecutor(self.extract_workers)
+        if self.index is not None:
+            self._scope = urlsplit(self.start_url).netloc
+            self._run = self.index.start_run(self._scope)
+        # robots.txt first and to completion, so that its rules apply to every URL queued
+        await self._read_robots()
+        self._enqueue(urljoin(self.start_url, "/sitemap.xml"), "sitemap")
+        self._enqueue(self.start_url)
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        done = asyncio.create_task(self._queue.join())
+        try:
+            while True:
+                next_result = asyncio.create_task(self._results.get())
+                await asyncio.wait({next_result, done}, return_when=asyncio.FIRST_COMPLETED)
+                if next_result.done():
+                    yield next_result.result()
+                    continue
+                next_result.cancel()
+                while not self._results.empty():
+                    yield self._results.get_nowait()
+                # Only a crawl that reached every link can tell which pages are gone
+                if self.index is not None:
+                    self.changes = self.index.finish_run(self._run, not (self.incomplete or self.dropped),
+                                                         self.failed)
+                break
+        finally:
+            for worker in workers:
+                worker.cancel()
+            done.cancel()
+            if self._extractors is not None:
+                self._extractors.shutdown(cancel_futures=True)
+                self._extractors = None
+
+async def crawl(start_url, **options):
+    """Async generator over page results for a whole site, see Crawler"""
+    async for page in Crawler(start_url, **options).run():
+        yield page
+
+async def _main(start_url, max_pages, index_path=None, accessibility=False):
+    start_time = time.time()
+    count = 0
+    reports = []
+    crawler = Crawler(start_url, max_pages=max_pages, index=ChangeIndex(index_path) if index_path else None,
+                      accessibility=accessibility)
+    async for page in crawler.run():
+        count += 1
+        if page["error"]:
+            print(f"[{count}] {page['url']} -> {page['error']}")
+            continue
+        text = page["text"] or ""
+        change = f", {page['change']}" if page["change"] else ""
+        print(f"[{count}] {page['url']} -> {page['status']} ({page['links']} links, "
+              f"{len(text)} characters extracted{change})")
+        if text and page["change"] != "unchanged":
+            print(f"    {text[:200]!r}")
+        if page["accessibility"] is not None:
+            reports.append(page["accessibility"])
+            issues = page["accessibility"]["issues"]
+            print(f"    {sum(issues.values())} accessibility issues"
+                  + "".join(f", {code} x{number}" for code, number in issues.items()))
+    print(f"Crawled {count} pages in {time.time() - start_time:.2f}s")
+    if reports:
+        print(f"Accessibility issues across {len(reports)} analyzed pages (pages affected):")
+        for code, pages in summarize(reports).items() or [("none", 0)]:
+            print(f"  {code:<20}{pages}")
+    if crawler.changes is not None:
+        print(format_changes(crawler.changes))
+
+if __name__ == "__main__":
+    # --accessibility adds an accessibility report for every page
+    accessibility = "--accessibility" in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--accessibility"]
+    url = "http://heaventree10.com/" if len(argv) < 2 else argv[1]
+    max_pages = 100 if len(argv) < 3 else int(argv[2])
+    # An index file makes repeat crawls report and skip unchanged pages
+    index_path = None if len(argv) < 4 else argv[3]
+    asyncio.run(_main(url, max_pages, index_path, accessibility))
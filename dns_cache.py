@@ -0,0 +1,147 @@
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from timeouts import DeadlineExceeded, propagate, timeout_for
+
+class DNSCache:
+    """
+    TTL-aware resolver cache shared by every connect path.
+
+    Names are resolved through dnspython so that the record TTL is known,
+    falling back to the system resolver (for /etc/hosts names such as
+    localhost) with `default_ttl`. Failed lookups are cached for
+    `negative_ttl` seconds so that dead names fail fast.
+    """
+
+    def __init__(self, min_ttl=5, max_ttl=3600, default_ttl=300, negative_ttl=60, lifetime=5):
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.lifetime = lifetime
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup_records(self, host):
+        # dnspython takes longer to import than a quick check takes to run,
+        # so it is only loaded once a name actually needs resolving
+        import dns.exception
+        import dns.resolver
+
+        addresses = []
+        ttls = []
+        try:
+            for record_type, family in (("A", socket.AF_INET), ("AAAA", socket.AF_INET6)):
+                try:
+                    answers = dns.resolver.resolve(host, record_type,
+                                                   lifetime=timeout_for(host, "dns", self.lifetime))
+                except dns.resolver.NXDOMAIN:
+                    break
+                except (dns.resolver.NoAnswer, dns.resolver.NoNameservers, dns.exception.Timeout):
+                    continue
+                ttls.append(answers.rrset.ttl)
+                addresses.extend((family, rdata.address) for rdata in answers)
+        except dns.exception.DNSException:
+            return [], []
+        return addresses, ttls
+
+    def _lookup_system(self, host):
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr[0]) not in addresses:
+                addresses.append((family, sockaddr[0]))
+        addresses.sort(key=lambda entry: entry[0] != socket.AF_INET)
+        return addresses
+
+    def resolve(self, host):
+        """
+        Return a list of (family, address) for `host`, IPv4 first.
+        Raises socket.gaierror if the name does not resolve.
+        """
+        try:
+            ip = ipaddress.ip_address(host)
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, host)]
+        except ValueError:
+            pass
+
+        host = host.lower().rstrip(".")
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                if isinstance(entry[1], Exception):
+                    raise entry[1]
+                return list(entry[1])
+            self.misses += 1
+
+        addresses, ttls = self._lookup_records(host)
+        if not addresses:
+            try:
+                addresses = self._lookup_system(host)
+            except socket.gaierror as e:
+                with self._lock:
+                    self._entries[host] = (now + self.negative_ttl, e)
+                raise
+            ttls = [self.default_ttl]
+
+        ttl = min(max(min(ttls), self.min_ttl), self.max_ttl)
+        with self._lock:
+            self._entries[host] = (now + ttl, addresses)
+        return list(addresses)
+
+    def ttl_remaining(self, host):
+        """Seconds until the cached entry for `host` expires, or None"""
+        with self._lock:
+            entry = self._entries.get(host.lower().rstrip("."))
+        if entry is None:
+            return None
+        return max(entry[0] - time.monotonic(), 0)
+
+    def prefetch(self, hosts, workers=32):
+        """Resolve many hosts in parallel and return {host: addresses or error}"""
+        def resolve_one(host):
+            try:
+                return host, self.resolve(host)
+            except (socket.gaierror, DeadlineExceeded) as e:
+                return host, e
+
+        unique_hosts = list(dict.fromkeys(hosts))
+        if not unique_hosts:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(workers, len(unique_hosts))) as executor:
+            return dict(executor.map(propagate(resolve_one), unique_hosts))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+def connect_addresses(addresses, port, timeout=None):
+    """Connect to the first reachable (family, address), in order"""
+    last_error = None
+    for family, ip in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect((ip, port))
+            return sock
+        except OSError as e:
+            last_error = e
+            sock.close()
+    raise last_error
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+def get_resolver():
+    """Return the process-wide resolver cache"""
+    global _default_resolver
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = DNSCache()
+        return _default_resolver
@@ -0,0 +1,131 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+def body_key(body, options=None):
+    """Hash of the normalized body plus the extraction options"""
+    if isinstance(body, str):
+        body = body.encode("utf-8", errors="surrogatepass")
+    body = body.replace(b"\r\n", b"\n").strip()
+    digest = hashlib.blake2b(body, digest_size=16)
+    digest.update(json.dumps(options or {}, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def _extract(body, options):
+    """trafilatura.extract, importable by worker processes"""
+    import trafilatura
+    return trafilatura.extract(body, **options)
+
+class ExtractionMemo:
+    """
+    Memoized trafilatura.extract results.
+
+    Results are kept in an in-memory LRU of `max_entries` and, when
+    `directory` is set, in one small JSON file per key on disk so that they
+    survive between runs. With an `executor` (a process pool, see
+    batch.py --extract-workers) misses are extracted there instead of on
+    the calling thread, out of the way of the GIL.
+    """
+
+    def __init__(self, max_entries=1024, directory=None, executor=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.executor = executor
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Extractions running right now
+        self.extracting = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def lookup(self, key):
+        """Return (found, text) for a key from body_key()"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+        if self.directory:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    text = json.load(f)["text"]
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+            else:
+                self._remember(key, text)
+                with self._lock:
+                    self.disk_hits += 1
+                return True, text
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def _remember(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def store(self, key, text):
+        self._remember(key, text)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"text": text}, f)
+            os.replace(temp_path, path)
+
+    @contextlib.contextmanager
+    def running(self):
+        """Count an extraction done by or for this memo in `extracting` while it runs"""
+        with self._lock:
+            self.extracting += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.extracting -= 1
+
+    def run(self, func, *args):
+        """Call `func(*args)` in the executor if there is one, else here, counted in `extracting`"""
+        with self.running():
+            if self.executor is not None:
+                return self.executor.submit(func, *args).result()
+            return func(*args)
+
+    def extract(self, body, **options):
+        """trafilatura.extract(body, **options), reusing any earlier result"""
+        key = body_key(body, options)
+        found, text = self.lookup(key)
+        if not found:
+            # trafilatura pulls in lxml and friends; only pay for it on a miss
+            text = self.run(_extract, body, options)
+            self.store(key, text)
+        return text
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "extracting": self.extracting}
+
+_default_memo = None
+_default_memo_lock = threading.Lock()
+
+def get_memo():
+    """Return the process-wide memo, with a disk tier under $EXTRACT_MEMO_DIR if set"""
+    global _default_memo
+    with _default_memo_lock:
+        if _default_memo is None:
+            _default_memo = ExtractionMemo(directory=os.environ.get("EXTRACT_MEMO_DIR"))
+        return _default_memo
+
+def extract(body, **options):
+    """Memoized drop-in for trafilatura.extract"""
+    return get_memo().extract(body, **options)
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from circuit_breaker import url_key, with_retries
+from extract_memo import body_key, get_memo
+from fetcher import get_session
+from http_stream import MAX_BODY_SIZE, read_capped
+
+def extract_text(html, options=None):
+    """Run trafilatura.extract in a worker process"""
+    import trafilatura
+    return trafilatura.extract(html, **(options or {}))
+
+def download(url, timeout=10, max_bytes=MAX_BODY_SIZE):
+    """Default download stage: fetch a URL and return at most `max_bytes` of its HTML"""
+    response = with_retries(url_key(url),
+                            lambda attempt: get_session().get(url, timeout=timeout, stream=True))
+    response._content, _ = read_capped(response.iter_content(65536), max_bytes)
+    response.close()
+    return response.text
+
+class ExtractionPipeline:
+    """
+    Download -> extract pipeline with a process pool for extraction.
+
+    Downloads run on `download_workers` threads and feed a pool of
+    `workers` extraction processes. At most `max_pending` items are in
+    flight (downloading, extracting, or finished but not yet delivered), so
+    a slow consumer or a slow extraction stage stops the input iterator from
+    being read any further. Bodies already in the extraction memo are
+    answered without a round trip to a worker.
+    """
+
+    def __init__(self, workers=None, download_workers=8, max_pending=None, options=None,
+                 downloader=download, memo=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.download_workers = download_workers
+        self.max_pending = max_pending or self.workers * 4
+        self.options = options or {}
+        self.downloader = downloader
+        self.memo = memo or get_memo()
+
+    def run(self, items, ordered=True, download=False):
+        """
+        Yield (key, text, error) for every item.
+
+        `items` is an iterable of (key, html) pairs, or of URLs when
+        `download` is true. With `ordered` results come back in input order,
+        otherwise as soon as each extraction finishes.
+        """
+        items = iter(items)
+        futures = {}
+        finished = {}
+        next_index = 0
+        submitted = 0
+        exhausted = False
+
+        with ProcessPoolExecutor(self.workers) as extractors, \
+                ThreadPoolExecutor(self.download_workers) as downloaders:
+            while True:
+                while not exhausted and submitted - next_index < self.max_pending:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if download:
+                        future = downloaders.submit(self.downloader, item)
+                        futures[future] = (submitted, item, None)
+                    else:
+                        key, html = item
+                        self._submit_extract(extractors, futures, finished, submitted, key, html)
+                    submitted += 1
+
+                if futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, key, memo_key = futures.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            finished[index] = (key, None, f"{type(e).__name__}: {e}")
+                            continue
+                        if memo_key is None:
+                            self._submit_extract(extractors, futures, finished, index, key, result)
+                        else:
+                            self.memo.store(memo_key, result)
+                            finished[index] = (key, result, None)
+
+                if ordered:
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+                else:
+                    for index in list(finished):
+                        yield finished.pop(index)
+                        next_index += 1
+
+                if exhausted and not futures and not finished:
+                    break
+
+    def _submit_extract(self, extractors, futures, finished, index, key, html):
+        """Answer from the memo when possible, otherwise queue a worker"""
+        memo_key = body_key(html, self.options)
+        found, text = self.memo.lookup(memo_key)
+        if found:
+            finished[index] = (key, text, None)
+        else:
+            future = extractors.submit(extract_text, html, self.options)
+            futures[future] = (index, key, memo_key)
+
+def extract_many(items, ordered=True, download=False, **options):
+    """Convenience wrapper around ExtractionPipeline(**options).run()"""
+    return ExtractionPipeline(**options).run(items, ordered=ordered, download=download)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python extract_pipeline.py <url-list-file> [workers] [--unordered]")
+        sys.exit(1)
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else None
+
+    start_time = time.time()
+    for url, text, error in extract_many(urls, ordered="--unordered" not in sys.argv,
+                                         download=True, workers=workers):
+        if error:
+            print(f"{url}: {error}")
+        else:
+            print(f"{url}: {len(text or '')} characters extracted")
+    print(f"Processed {len(urls)} URLs in {time.time() - start_time:.2f}s")
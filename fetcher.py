@@ -0,0 +1,141 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import DEFAULT_CA_BUNDLE_PATH, HTTPAdapter
+
+import extract_memo
+from circuit_breaker import url_key, with_retries
+from http_cache import get_cache
+from http_stream import MAX_BODY_SIZE, read_capped
+from timeouts import timeout_for
+from tls import get_ssl_context
+from tracing import get_tracer
+
+class SharedContextAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose HTTPS pools use the shared context for their `verify`
+    mode instead of building a context and loading the CA bundle for every
+    new connection
+    """
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if host_params["scheme"] == "https":
+            pool_kwargs["ssl_context"] = get_ssl_context(DEFAULT_CA_BUNDLE_PATH if verify is True else verify)
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if getattr(conn, "conn_kw", {}).get("ssl_context") is not None:
+            # The shared context already holds the trust store
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Return the process-wide requests session. Its adapter keeps up to 32
+    connections per host alive and shares one SSLContext per verify mode.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = SharedContextAdapter(pool_connections=32, pool_maxsize=32)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def fetch(url, headers=None, session=None, timeout=10, use_cache=True, max_bytes=MAX_BODY_SIZE, **kwargs):
+    """
+    Download a URL once and return a result dict.
+
+    `transport` says where the bytes came from: "requests" for a full
+    transfer, or "cache" / "cache-revalidated" when the HTTP cache answered.
+    `timeout` is the default for connect and read; see timeouts.timeout_for().
+    Connection failures are retried through the origin's circuit breaker.
+    At most `max_bytes` of the body are read (None for no cap); `truncated`
+    says whether the page was cut off.
+    """
+    session = session or get_session()
+    start_time = time.monotonic()
+    host = urlsplit(url).hostname
+    trace = get_tracer().start("requests", url, host)
+
+    def attempt(number):
+        trace.retries = number
+        timeouts = (timeout_for(host, "connect", timeout), timeout_for(host, "read", timeout))
+        if use_cache:
+            return get_cache().get(url, headers=headers, session=session, timeout=timeouts,
+                                   max_bytes=max_bytes, **kwargs)
+        response = session.get(url, headers=headers, timeout=timeouts, stream=max_bytes is not None, **kwargs)
+        response.truncated = False
+        if max_bytes is not None:
+            response._content, response.truncated = read_capped(response.iter_content(65536), max_bytes)
+            response.close()
+        return response
+
+    try:
+        response = with_retries(url_key(url), attempt)
+        transport = "requests"
+        if use_cache:
+            transport = {"hit": "cache", "revalidated": "cache-revalidated"}.get(response.from_cache, "requests")
+    except Exception as e:
+        trace.finish(e)
+        raise
+    if transport == "requests":
+        # requests only exposes the time from sending to parsed headers
+        trace.mark("first_byte", response.elapsed.total_seconds())
+        trace.mark("body_complete")
+        trace.bytes_received = len(response.content)
+    trace.finish()
+    return {
+        "url": url,
+        "final_url": response.url or url,
+        "status": response.status_code,
+        "headers": response.headers,
+        "content_type": response.headers.get("Content-Type", ""),
+        "content": response.content,
+        "encoding": response.encoding,
+        "transport": transport,
+        "truncated": response.truncated,
+        "elapsed": time.monotonic() - start_time,
+        "phases": trace.durations(),
+    }
+
+def fetch_and_extract(url, headers=None, session=None, timeout=10, extract_options=None, accessibility=False,
+                      **kwargs):
+    """
+    Download a URL once and hand the same bytes to extraction.
+
+    Returns the fetch() result with `text` (the extracted content or None)
+    and `extract_time` added. With `accessibility` the page is also
+    analyzed, from the same parse as extraction, into `accessibility` (see
+    accessibility.analyze).
+    """
+    result = fetch(url, headers=headers, session=session, timeout=timeout, **kwargs)
+    start_time = time.monotonic()
+    result["text"] = None
+    if result["content"] and accessibility:
+        from accessibility import analyze_page
+        memo = extract_memo.get_memo()
+        memo_key = extract_memo.body_key(result["content"], extract_options)
+        found, result["text"] = memo.lookup(memo_key)
+        text, result["accessibility"], _ = memo.run(analyze_page, result["content"], extract_options, not found)
+        if not found:
+            result["text"] = text
+            memo.store(memo_key, text)
+    elif result["content"]:
+        result["text"] = extract_memo.extract(result["content"], **(extract_options or {}))
+    elif accessibility:
+        result["accessibility"] = None
+    result["extract_time"] = time.monotonic() - start_time
+    return result
+
+def decode_content(result):
+    """Decode fetched bytes with the declared charset, or UTF-8"""
+    return result["content"].decode(result["encoding"] or "utf-8", errors="replace")
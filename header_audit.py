@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from http_pool import get_pool
+from timeouts import propagate
+
+# Header name -> short column label for the per-host table
+SECURITY_HEADERS = {
+    "strict-transport-security": "HSTS",
+    "content-security-policy": "CSP",
+    "x-content-type-options": "XCTO",
+    "x-frame-options": "XFO",
+    "referrer-policy": "Referrer",
+    "permissions-policy": "Perms",
+}
+CACHING_HEADERS = {
+    "cache-control": "Cache",
+    "etag": "ETag",
+    "last-modified": "LastMod",
+    "expires": "Expires",
+    "vary": "Vary",
+}
+
+# Statuses that mean the server does not do HEAD for this URL
+HEAD_REJECTED = (405, 501)
+# Never read more body than this, even when a server ignores Range
+BODY_LIMIT = 256
+
+def _target(url):
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return parts.scheme, parts.hostname, parts.port, path
+
+def _probe(method, url, headers, timeout):
+    scheme, host, port, path = _target(url)
+    with get_pool().stream(method, host, path, port=port, scheme=scheme, headers=headers,
+                           timeout=timeout) as response:
+        response.read(BODY_LIMIT)
+    return response
+
+def _size(response):
+    """Full size of the resource from Content-Range or Content-Length"""
+    total = response.headers.get("content-range", "").rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    length = response.headers.get("content-length", "")
+    return int(length) if length.isdigit() else None
+
+def audit_url(url, timeout=5):
+    """
+    Audit one URL's headers without downloading it.
+
+    Sends HEAD over the shared pool; if the server rejects HEAD, sends GET
+    with `Range: bytes=0-0` instead and reads at most BODY_LIMIT bytes, so
+    each audit costs a few hundred bytes however large the resource is.
+    """
+    scheme, host, port, path = _target(url)
+    result = {
+        "url": url,
+        "host": host,
+        "method": "HEAD",
+        "status": None,
+        "content_type": None,
+        "size": None,
+        "location": None,
+        "security": {},
+        "caching": {},
+        "bytes": 0,
+        "error": None,
+    }
+    start_time = time.monotonic()
+    try:
+        response = _probe("HEAD", url, None, timeout)
+        result["bytes"] += len(response.raw_head())
+        if response.status in HEAD_REJECTED:
+            result["method"] = "GET range"
+            response = _probe("GET", url, {"Range": "bytes=0-0"}, timeout)
+            result["bytes"] += len(response.raw_head()) + response.body_size
+        headers = response.headers
+        result["status"] = response.status
+        result["content_type"] = headers.get("content-type")
+        result["size"] = _size(response)
+        result["location"] = headers.get("location")
+        result["security"] = {name: headers[name] for name in SECURITY_HEADERS if name in headers}
+        result["caching"] = {name: headers[name] for name in CACHING_HEADERS if name in headers}
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = time.monotonic() - start_time
+    return result
+
+async def audit_urls(urls, timeout=5, concurrency=64, per_host=6):
+    """
+    Audit many URLs concurrently, at most `concurrency` in flight overall
+    and `per_host` per host (the pool's keep-alive limit), on an executor
+    of `concurrency` threads. Results are in the order of `urls`.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    host_slots = {}
+
+    async def audit(url):
+        slots = host_slots.setdefault(_target(url)[1], asyncio.Semaphore(per_host))
+        async with slots:
+            # Like to_thread, run in the caller's context so that deadlines apply
+            return await loop.run_in_executor(executor, propagate(audit_url), url, timeout)
+
+    try:
+        return list(await asyncio.gather(*(audit(url) for url in urls)))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def resource_urls(target, paths):
+    """URLs for `paths` on the host of `target` (a URL or a bare domain)"""
+    scheme, host, port, _ = _target(target)
+    netloc = host if port is None else f"{host}:{port}"
+    return [f"{scheme}://{netloc}{path}" for path in paths]
+
+def summarize_hosts(results):
+    """Fold audit results into {host: compact summary}"""
+    hosts = {}
+    for result in results:
+        summary = hosts.setdefault(result["host"], {
+            "urls": 0,
+            "errors": 0,
+            "bytes": 0,
+            "statuses": {},
+            "headers": {label: 0 for label in list(SECURITY_HEADERS.values()) + list(CACHING_HEADERS.values())},
+        })
+        summary["urls"] += 1
+        summary["bytes"] += result["bytes"]
+        if result["error"]:
+            summary["errors"] += 1
+            continue
+        summary["statuses"][result["status"]] = summary["statuses"].get(result["status"], 0) + 1
+        for name in list(result["security"]) + list(result["caching"]):
+            summary["headers"][SECURITY_HEADERS.get(name) or CACHING_HEADERS[name]] += 1
+    return hosts
+
+def format_host_table(hosts):
+    """
+    Render summarize_hosts() as one row per host; each header column is
+    the number of answered URLs that sent it
+    """
+    labels = list(SECURITY_HEADERS.values()) + list(CACHING_HEADERS.values())
+    lines = [f"{'host':<32}{'urls':>6}{'err':>5}" + "".join(f"{label:>9}" for label in labels)
+             + f"{'bytes':>9}  statuses"]
+    for host, summary in sorted(hosts.items()):
+        answered = summary["urls"] - summary["errors"]
+        cells = "".join(f"{summary['headers'][label]}/{answered}".rjust(9) for label in labels)
+        statuses = " ".join(f"{status}x{count}" for status, count in sorted(summary["statuses"].items()))
+        lines.append(f"{host:<32}{summary['urls']:>6}{summary['errors']:>5}{cells}{summary['bytes']:>9}  {statuses}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit security and caching headers without downloading bodies")
+    parser.add_argument("targets", nargs="*", help="URLs or domains")
+    parser.add_argument("-f", "--file", help="read more targets from this file, one per line")
+    parser.add_argument("-r", "--resources", action="store_true",
+                        help="audit the common resources on each target's host instead of the target itself")
+    parser.add_argument("-c", "--concurrency", type=int, default=64, help="audits in flight at once")
+    parser.add_argument("-t", "--timeout", type=float, default=5, help="timeout per request in seconds")
+    parser.add_argument("--json", help="write one JSON line per audited URL to this file")
+    args = parser.parse_args(argv)
+
+    targets = list(args.targets)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            targets.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not targets:
+        parser.error("no targets given")
+    if args.resources:
+        from check_specific_resources import COMMON_RESOURCES
+        urls = [url for target in targets for url in resource_urls(target, COMMON_RESOURCES)]
+    else:
+        urls = [target if "://" in target else f"https://{target}/" for target in targets]
+
+    start_time = time.time()
+    results = asyncio.run(audit_urls(urls, args.timeout, args.concurrency))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    print(format_host_table(summarize_hosts(results)))
+    print(f"Audited {len(results)} URLs in {time.time() - start_time:.2f}s, "
+          f"{sum(result['bytes'] for result in results)} bytes received", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import email.utils
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from http_stream import read_capped
+
+CACHEABLE_STATUS = (200, 203, 301, 404, 410)
+HEURISTIC_FRESHNESS_CAP = 24 * 3600
+
+def _parse_http_date(value):
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def _cache_control(headers):
+    directives = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+def _seconds(value):
+    """A delta-seconds value, or None if it is not one"""
+    value = (value or "").strip()
+    return int(value) if value.isascii() and value.isdigit() else None
+
+def freshness_lifetime(headers, now=None):
+    """Seconds the response stays fresh from the time it was stored; malformed values make it stale"""
+    now = now or time.time()
+    directives = _cache_control(headers)
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            max_age, age = _seconds(directives[name]), _seconds(headers.get("Age") or "0")
+            if max_age is None or age is None:
+                return 0
+            return max_age - age
+    date = _parse_http_date(headers.get("Date")) or now
+    if "Expires" in headers:
+        # An invalid Expires (e.g. "0") means already expired (RFC 9111 5.3)
+        expires = _parse_http_date(headers.get("Expires"))
+        return expires - date if expires is not None else 0
+    last_modified = _parse_http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        # Heuristic freshness: 10% of the time since the last change
+        return min((date - last_modified) / 10, HEURISTIC_FRESHNESS_CAP)
+    return 0
+
+def _servable(entry, request_headers):
+    """Whether a stored entry may be served without asking the server, given the request's Cache-Control"""
+    request_headers = CaseInsensitiveDict(request_headers)
+    directives = _cache_control(request_headers)
+    if "no-cache" in directives or "no-cache" in request_headers.get("Pragma", "").lower():
+        return False
+    now = time.time()
+    if "max-age" in directives:
+        max_age = _seconds(directives["max-age"])
+        if max_age is None or now - entry["stored_at"] > max_age:
+            return False
+    return now < entry["fresh_until"]
+
+class HTTPCache:
+    """
+    Persistent HTTP cache with content-addressed bodies.
+
+    Entries are keyed by URL plus the request header values named in the
+    response's Vary header and kept in a SQLite index. Bodies are stored once
+    per SHA-256 under objects/. Stale entries are revalidated with
+    If-None-Match / If-Modified-Since, and the least recently used entries
+    are evicted once the stored bodies exceed `max_size` bytes.
+    """
+
+    def __init__(self, directory=".http_cache", max_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS vary (
+                url TEXT PRIMARY KEY,
+                names TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                fresh_until REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+            CREATE INDEX IF NOT EXISTS entries_body ON entries (body_hash);
+        """)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        # Bytes of distinct bodies, counted up as this process stores them so
+        # that evict() needs no full scan until the limit is reached; replaced
+        # entries make it run high, and evict() recounts before dropping any
+        self._size = self._stored_size()
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.directory, "objects", body_hash[:2], body_hash)
+
+    def _key(self, url, request_headers, names):
+        request_headers = CaseInsensitiveDict(request_headers or {})
+        parts = [url] + [f"{name}:{request_headers.get(name, '')}" for name in names]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def lookup(self, url, request_headers=None):
+        """Return the stored entry for a request as a dict, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT names FROM vary WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            names = json.loads(row[0])
+            if "*" in names:
+                return None
+            key = self._key(url, request_headers, names)
+            row = self._db.execute(
+                "SELECT status, headers, body_hash, stored_at, fresh_until FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        status, headers, body_hash, stored_at, fresh_until = row
+        try:
+            with open(self._object_path(body_hash), "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        return {"key": key, "status": status, "headers": json.loads(headers),
+                "body": body, "stored_at": stored_at, "fresh_until": fresh_until}
+
+    def store(self, url, request_headers, status, headers, body):
+        """Store a response unless it is uncacheable"""
+        headers = CaseInsensitiveDict(headers)
+        if status not in CACHEABLE_STATUS or "no-store" in _cache_control(headers):
+            return
+        names = [name.strip() for name in headers.get("Vary", "").split(",") if name.strip()]
+        now = time.time()
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._object_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(body)
+            os.replace(temp_path, path)
+
+        key = self._key(url, request_headers, names)
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is None:
+                self._size += len(body)
+            self._db.execute("INSERT OR REPLACE INTO vary (url, names) VALUES (?, ?)",
+                             (url, json.dumps(names)))
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(dict(headers)), body_hash, len(body),
+                 now, now + freshness_lifetime(headers, now), now),
+            )
+            self._db.commit()
+        self.evict()
+
+    def _refresh(self, entry, headers):
+        """Merge the headers of a 304 into a stored entry and renew its freshness"""
+        merged = CaseInsensitiveDict(entry["headers"])
+        for name, value in headers.items():
+            if name.lower() not in ("content-length", "transfer-encoding", "content-encoding"):
+                merged[name] = value
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET headers = ?, stored_at = ?, fresh_until = ?, last_access = ? WHERE key = ?",
+                (json.dumps(dict(merged)), now, now + freshness_lifetime(merged, now), now, entry["key"]),
+            )
+            self._db.commit()
+        entry["headers"] = dict(merged)
+        entry["stored_at"] = now
+        return entry
+
+    def _stored_size(self):
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+        ).fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the stored bodies fit in max_size"""
+        with self._lock:
+            if self._size <= self.max_size:
+                return
+            total = self._size = self._stored_size()
+            if total <= self.max_size:
+                return
+            rows = self._db.execute("SELECT key, body_hash, size FROM entries ORDER BY last_access").fetchall()
+            for key, body_hash, size in rows:
+                if total <= self.max_size:
+                    break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                still_used = self._db.execute(
+                    "SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone()
+                if not still_used:
+                    total -= size
+                    try:
+                        os.remove(self._object_path(body_hash))
+                    except FileNotFoundError:
+                        pass
+            self._size = total
+            self._db.commit()
+
+    def get(self, url, headers=None, session=None, max_bytes=None, **kwargs):
+        """
+        GET a URL through the cache and return a requests.Response.
+
+        The response has a `from_cache` attribute: "hit" for a fresh entry,
+        "revalidated" when the server answered 304, or None when the body
+        was transferred. A request with `Cache-Control: no-cache` or
+        `max-age` older than the entry revalidates even a fresh entry. With `max_bytes` the transfer stops after that many
+        bytes and `truncated` is set; truncated bodies are not stored.
+        Extra keyword arguments go to session.get().
+        """
+        session = session or requests
+        request_headers = dict(headers or {})
+        entry = self.lookup(url, request_headers)
+        if entry is not None and _servable(entry, request_headers):
+            self.hits += 1
+            return self._response(url, entry, "hit")
+
+        conditional = dict(request_headers)
+        if entry is not None:
+            stored = CaseInsensitiveDict(entry["headers"])
+            if "ETag" in stored:
+                conditional["If-None-Match"] = stored["ETag"]
+            if "Last-Modified" in stored:
+                conditional["If-Modified-Since"] = stored["Last-Modified"]
+
+        if max_bytes is not None:
+            kwargs["stream"] = True
+        response = session.get(url, headers=conditional, **kwargs)
+        response.truncated = False
+        if max_bytes is not None:
+            response._content, response.truncated = read_capped(response.iter_content(65536), max_bytes)
+            response.close()
+        if entry is not None and response.status_code == 304:
+            self.revalidated += 1
+            return self._response(url, self._refresh(entry, response.headers), "revalidated")
+
+        self.misses += 1
+        if not response.history and not response.truncated:
+            self.store(url, request_headers, response.status_code, response.headers, response.content)
+        response.from_cache = None
+        return response
+
+    def _response(self, url, entry, source):
+        response = requests.models.Response()
+        response.url = url
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        response.truncated = False
+        response.from_cache = source
+        return response
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, stored under $HTTP_CACHE_DIR or .http_cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache(os.environ.get("HTTP_CACHE_DIR", ".http_cache"))
+        return _default_cache
@@ -0,0 +1,222 @@
+import contextlib
+import threading
+import time
+
+from dns_cache import connect_addresses, get_resolver
+from circuit_breaker import origin_key, with_retries
+from http_stream import ResponseReader
+from timeouts import timeout_for
+from tls import get_ssl_context, get_tls_sessions
+from tracing import get_tracer
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "*/*",
+}
+
+class PooledResponse:
+    """A complete HTTP response read from a pooled connection"""
+
+    def __init__(self, response, body):
+        self.status_line = response.status_line
+        self.status = response.status
+        self.reason = response.reason
+        self.header_list = response.header_list
+        self.headers = response.headers
+        self.body = body
+        self.reused = response.reused
+        self.tls_resumed = response.tls_resumed
+        self.timings = response.timings
+        self._response = response
+
+    def raw_head(self):
+        return self._response.raw_head()
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = ResponseReader(sock)
+        self.requests = 0
+
+    def close(self):
+        try:
+            self.sock.close()
+        except:
+            pass
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections shared by every probe.
+
+    Idle connections are kept per (scheme, host, port) and reused for the next
+    request to the same origin. Responses are framed by Content-Length or
+    chunked encoding, so a request is finished as soon as its body is read.
+    HTTPS connections share one SSLContext and resume the host's last TLS
+    session where the server allows it.
+    """
+
+    def __init__(self, max_per_host=6, idle_timeout=30, ssl_context=None):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context or get_ssl_context()
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, released_at = idle.pop()
+                if time.monotonic() - released_at < self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_per_host:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _connect(self, scheme, host, port, timeout, trace):
+        addresses = get_resolver().resolve(host)
+        trace.mark("dns")
+        sock = connect_addresses(addresses, port, timeout)
+        trace.mark("connect")
+        if scheme == "https":
+            sock = get_tls_sessions().wrap(sock, host, port, self.ssl_context)
+            trace.mark("tls")
+        return _Connection(sock)
+
+    def _send(self, conn, method, request, timeout, trace):
+        conn.sock.settimeout(timeout)
+        conn.sock.sendall(request)
+        trace.bytes_sent += len(request)
+        trace.mark("request_sent")
+        conn.requests += 1
+        response = conn.reader.read_response(method)
+        trace.mark("first_byte")
+        return response
+
+    def _open(self, key, method, request, timeout, trace):
+        """Send the request on an idle or new connection and read the response head"""
+        scheme, host, port = key
+        # Learned per-host timeouts, cut to the current deadline
+        connect_timeout = timeout_for(host, "connect", timeout)
+        read_timeout = timeout_for(host, "read", timeout)
+        conn = self._checkout(key)
+        if conn is not None:
+            trace.reused = True
+            try:
+                return conn, self._send(conn, method, request, read_timeout, trace)
+            except ConnectionError:
+                # The server dropped the idle connection, retry on a new one
+                conn.close()
+                trace.reused = False
+                trace.retries += 1
+                trace.marks.clear()
+            except Exception:
+                conn.close()
+                raise
+        conn = self._connect(scheme, host, port, connect_timeout, trace)
+        try:
+            return conn, self._send(conn, method, request, read_timeout, trace)
+        except Exception:
+            conn.close()
+            raise
+
+    @contextlib.contextmanager
+    def stream(self, method, host, path="/", port=None, scheme="http", headers=None, timeout=5):
+        """
+        Send one request and yield a StreamingResponse whose body has not
+        been read yet. The connection goes back to the pool only if the body
+        was read to the end. Every request is recorded as a "pool" trace.
+        `timeout` is the default for connect and for each read; slow hosts
+        with enough history get longer learned timeouts, and both are cut
+        to the current deadline (see timeouts.py). Connection failures are
+        retried and counted by the circuit breaker of (scheme, host, port).
+        `host` and `path` must already be ASCII (IDNA, percent-encoding).
+        """
+        if port is None:
+            port = 443 if scheme == "https" else 80
+        if not (host.isascii() and path.isascii()):
+            # Never guess an encoding for the request line; callers percent-encode
+            raise ValueError(f"Request target is not ASCII: {host}{path}")
+        key = (scheme, host, port)
+
+        request_headers = dict(DEFAULT_HEADERS)
+        if headers:
+            request_headers.update(headers)
+        request_headers["Host"] = host if port in (80, 443) else f"{host}:{port}"
+        request_headers.setdefault("Connection", "keep-alive")
+        request = f"{method} {path} HTTP/1.1\r\n"
+        request += "".join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        request = (request + "\r\n").encode("latin-1")
+
+        trace = get_tracer().start("pool", f"{method} {scheme}://{host}:{port}{path}", host)
+
+        def attempt(number):
+            if number:
+                trace.retries += 1
+                trace.marks.clear()
+            return self._open(key, method, request, timeout, trace)
+
+        try:
+            conn, response = with_retries(origin_key(host, port, scheme), attempt)
+        except Exception as e:
+            trace.finish(e)
+            raise
+
+        marks = trace.marks
+        response.reused = trace.reused
+        response.tls_resumed = getattr(conn.sock, "session_reused", False)
+        response.trace = trace
+        response.timings = {
+            "connect": marks.get("tls", marks.get("connect", 0.0)),
+            "first_byte": marks["first_byte"],
+        }
+        try:
+            yield response
+        except BaseException as e:
+            conn.close()
+            trace.bytes_received = response.body_size
+            trace.finish(e)
+            raise
+        trace.bytes_received = response.body_size
+        if response.complete:
+            trace.mark("body_complete")
+        response.timings["total"] = time.monotonic() - trace.start
+        if scheme == "https":
+            get_tls_sessions().remember(conn.sock, host, port)
+        if response.complete and response.keep_alive:
+            self._checkin(key, conn)
+        else:
+            conn.close()
+        trace.finish()
+
+    def request(self, method, host, path="/", port=None, scheme="http", headers=None, timeout=5):
+        """Send one request and return a PooledResponse with the full body"""
+        with self.stream(method, host, path, port, scheme, headers, timeout) as response:
+            body = response.read()
+        return PooledResponse(response, body)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, _ in idle:
+                    conn.close()
+            self._idle.clear()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
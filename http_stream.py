@@ -0,0 +1,236 @@
+import codecs
+import io
+
+MAX_HEAD_SIZE = 65536
+# Default cap on how much of a page body is read for extraction
+MAX_BODY_SIZE = 5 * 1024 * 1024
+
+def charset(content_type, default="utf-8"):
+    """The charset parameter of a Content-Type header, or `default`"""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "charset" and value:
+            return value.strip('"\'')
+    return default
+
+def read_capped(chunks, max_bytes=None):
+    """
+    Join byte chunks into one bytes object, stopping after `max_bytes`.
+    Returns (body, truncated); the rest of the stream is left unread.
+    """
+    body = bytearray()
+    for chunk in chunks:
+        if max_bytes is not None and len(body) + len(chunk) > max_bytes:
+            body += chunk[:max_bytes - len(body)]
+            return bytes(body), True
+        body += chunk
+    return bytes(body), False
+
+class IncompleteResponse(ConnectionError):
+    """The server closed the connection before the response was complete"""
+
+class ResponseReader:
+    """
+    Incremental HTTP/1.x response reader over a blocking socket.
+
+    Bytes are received into one reusable buffer per connection. The status
+    line and headers are parsed as they arrive, and the body is handed out as
+    memoryview slices of that buffer instead of being joined and decoded.
+    """
+
+    def __init__(self, sock, bufsize=65536):
+        self.sock = sock
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def _fill(self):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buf):
+            if self._start == 0:
+                raise ValueError("Response head larger than read buffer")
+            pending = self._end - self._start
+            self._buf[:pending] = self._buf[self._start:self._end]
+            self._start, self._end = 0, pending
+        received = self.sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def readline(self):
+        """Return the next CRLF-terminated line without its terminator"""
+        while True:
+            newline = self._buf.find(b"\r\n", self._start, self._end)
+            if newline >= 0:
+                line = bytes(self._view[self._start:newline])
+                self._start = newline + 2
+                return line
+            if self._end - self._start > MAX_HEAD_SIZE:
+                raise ValueError("Header line too long")
+            if not self._fill():
+                raise IncompleteResponse("Connection closed while reading headers")
+
+    def read_chunks(self, size=None):
+        """
+        Yield up to `size` body bytes (or everything until EOF when `size`
+        is None) as memoryviews that stay valid only until the next chunk.
+        """
+        remaining = size
+        while remaining is None or remaining > 0:
+            if self._start == self._end:
+                self._start = self._end = 0
+                limit = len(self._buf) if remaining is None else min(remaining, len(self._buf))
+                received = self.sock.recv_into(self._view[:limit])
+                if not received:
+                    if remaining is None:
+                        return
+                    raise IncompleteResponse("Connection closed mid-body")
+                self._end = received
+            take = self._end - self._start
+            if remaining is not None:
+                take = min(take, remaining)
+                remaining -= take
+            chunk = self._view[self._start:self._start + take]
+            self._start += take
+            yield chunk
+
+    def read_exact(self, size):
+        data = bytearray()
+        for chunk in self.read_chunks(size):
+            data += chunk
+        return bytes(data)
+
+    def read_head(self):
+        """Parse one status line and its headers into (status line, header list)"""
+        status_line = self.readline().decode("latin-1")
+        header_list = []
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            header_list.append((name.strip(), value.strip()))
+        return status_line, header_list
+
+    def read_response(self, method="GET"):
+        """
+        Parse a status line and headers and return a StreamingResponse.
+        Interim 1xx responses (103 Early Hints, 100 Continue) are skipped;
+        101 Switching Protocols is returned as it is.
+        """
+        while True:
+            status_line, header_list = self.read_head()
+            status = _status_code(status_line)
+            if not 100 <= status < 200 or status == 101:
+                return StreamingResponse(self, method, status_line, header_list)
+
+def _status_code(status_line):
+    parts = status_line.split(" ", 2)
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+class StreamingResponse:
+    """Status and headers of a response whose body has not been read yet"""
+
+    def __init__(self, reader, method, status_line, header_list):
+        self.reader = reader
+        self.status_line = status_line
+        parts = status_line.split(" ", 2)
+        self.version = parts[0]
+        self.status = _status_code(status_line)
+        self.reason = parts[2] if len(parts) > 2 else ""
+        self.header_list = header_list
+        self.headers = {name.lower(): value for name, value in header_list}
+        self.body_size = 0
+        self.complete = False
+        self.truncated = False
+
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            self.keep_alive = "close" not in connection
+        else:
+            self.keep_alive = "keep-alive" in connection
+
+        if 100 <= self.status < 200:
+            # Only 101 gets here, and the connection no longer speaks HTTP
+            self._framing = "none"
+            self.keep_alive = False
+        elif method == "HEAD" or self.status in (204, 304):
+            self._framing = "none"
+        elif "chunked" in self.headers.get("transfer-encoding", "").lower():
+            self._framing = "chunked"
+        elif "content-length" in self.headers:
+            self._framing = "length"
+        else:
+            self._framing = "close"
+            self.keep_alive = False
+        self.complete = self._framing == "none"
+
+    def raw_head(self):
+        """Rebuild the status line and headers as they came off the wire"""
+        lines = [self.status_line] + [f"{name}: {value}" for name, value in self.header_list]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def iter_body(self):
+        """Yield the decoded-framing body as memoryviews over the read buffer"""
+        if self.complete:
+            return
+        if self._framing == "length":
+            chunks = self.reader.read_chunks(int(self.headers["content-length"]))
+        elif self._framing == "chunked":
+            chunks = self._iter_chunked()
+        elif self._framing == "close":
+            chunks = self.reader.read_chunks()
+        else:
+            chunks = ()
+        for chunk in chunks:
+            self.body_size += len(chunk)
+            yield chunk
+        self.complete = True
+
+    def _iter_chunked(self):
+        reader = self.reader
+        while True:
+            size = int(reader.readline().split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip trailers up to the terminating empty line
+                while reader.readline():
+                    pass
+                return
+            yield from reader.read_chunks(size)
+            reader.read_exact(2)
+
+    def read(self, max_bytes=None):
+        """Read the body into a single bytes object, at most `max_bytes` of it"""
+        body, self.truncated = read_capped(self.iter_body(), max_bytes)
+        return body
+
+    def read_text(self, max_bytes=None, default_charset="utf-8"):
+        """
+        Decode the body chunk by chunk with the declared charset (or
+        `default_charset`), reading at most `max_bytes`. The raw body is
+        never held in full; undecodable bytes become U+FFFD.
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(charset(self.headers.get("content-type", ""), default_charset))
+        except LookupError:
+            decoder = codecs.getincrementaldecoder(default_charset)
+        decoder = decoder(errors="replace")
+        text = io.StringIO()
+        size = 0
+        for chunk in self.iter_body():
+            if max_bytes is not None and size + len(chunk) > max_bytes:
+                # A character cut off at the cap is dropped
+                text.write(decoder.decode(bytes(chunk[:max_bytes - size])))
+                self.truncated = True
+                return text.getvalue()
+            size += len(chunk)
+            text.write(decoder.decode(bytes(chunk)))
+        text.write(decoder.decode(b"", final=True))
+        return text.getvalue()
+
+    def drain(self):
+        """Consume the body without keeping it and return its size"""
+        for _ in self.iter_body():
+            pass
+        return self.body_size
@@ -0,0 +1,251 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracing import Histogram, get_tracer
+
+# Quantiles reported for every latency summary
+QUANTILES = (50, 90, 95, 99)
+
+def _singleton(module, name):
+    """A process-wide instance if its module is loaded and it was created, else None"""
+    return getattr(sys.modules.get(module), name, None)
+
+def _hit_rate(hits, total):
+    return hits / total if total else None
+
+class RunMetrics:
+    """
+    Live counters for a long batch run.
+
+    The runner reports each target as it is queued, starts and finishes;
+    snapshot() combines that with the tracer's request counters and
+    latencies, and with the HTTP cache, extraction memo and DNS cache of
+    this process when they are in use. Caches are never created just to be
+    measured.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.latency = Histogram()
+        self._sample = (self.started, 0)
+        self._rate = 0.0
+
+    def target_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def target_started(self):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+    def target_finished(self, record):
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            self.failed += not record["ok"]
+            self.latency.observe(record["elapsed"])
+
+    def _bytes_per_second(self, now, received):
+        """Receive rate over the last second or more; between samples the last rate stands"""
+        sample_time, sample_bytes = self._sample
+        if now - sample_time >= 1:
+            self._rate = (received - sample_bytes) / (now - sample_time)
+            self._sample = (now, received)
+        return self._rate
+
+    def snapshot(self):
+        """Everything as one JSON-serialisable dict; latencies in seconds"""
+        tracer = get_tracer().summary()
+        now = time.monotonic()
+        counters = tracer["counters"]
+        with self._lock:
+            snapshot = {
+                "time": time.time(),
+                "uptime": now - self.started,
+                "targets": {
+                    "queued": self.queued,
+                    "running": self.running,
+                    "completed": self.completed,
+                    "failed": self.failed,
+                    "per_second": self.completed / (now - self.started) if now > self.started else 0.0,
+                },
+                "target_latency": self.latency.to_dict(),
+                "requests": {
+                    "in_flight": tracer["in_flight"],
+                    "completed": counters["traces"],
+                    "failed": counters["errors"],
+                    "retries": counters["retries"],
+                },
+                "bytes_received": counters["bytes_received"],
+                "bytes_per_second": self._bytes_per_second(now, counters["bytes_received"]),
+                "request_latency": {name[:-len(".total")]: stats for name, stats in tracer["histograms"].items()
+                                    if name.endswith(".total")},
+                "extraction": None,
+                "http_cache": None,
+                "dns_cache": None,
+            }
+        memo = _singleton("extract_memo", "_default_memo")
+        if memo is not None:
+            stats = memo.stats()
+            hits = stats["hits"] + stats["disk_hits"]
+            snapshot["extraction"] = {"hit_rate": _hit_rate(hits, hits + stats["misses"]), **stats}
+        cache = _singleton("http_cache", "_default_cache")
+        if cache is not None:
+            stats = cache.stats()
+            hits = stats["hits"] + stats["revalidated"]
+            snapshot["http_cache"] = {"hit_rate": _hit_rate(hits, hits + stats["misses"]), **stats}
+        resolver = _singleton("dns_cache", "_default_resolver")
+        if resolver is not None:
+            stats = resolver.stats()
+            snapshot["dns_cache"] = {"hit_rate": _hit_rate(stats["hits"], stats["hits"] + stats["misses"]), **stats}
+        return snapshot
+
+def format_prometheus(snapshot):
+    """Render a snapshot in the Prometheus text exposition format"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    def summary(name, help_text, histograms):
+        samples = []
+        for labels, stats in histograms:
+            for quantile in QUANTILES:
+                samples.append(({**labels, "quantile": quantile / 100}, stats[f"p{quantile}"]))
+        metric(name, "summary", help_text, samples)
+        for labels, stats in histograms:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}_count{suffix} {stats['count']}")
+            lines.append(f"{name}_sum{suffix} {(stats['mean'] or 0) * stats['count']}")
+
+    targets = snapshot["targets"]
+    requests = snapshot["requests"]
+    metric("batch_uptime_seconds", "gauge", "Seconds since the run started", [({}, snapshot["uptime"])])
+    metric("batch_targets_queued", "gauge", "Targets waiting for a worker", [({}, targets["queued"])])
+    metric("batch_targets_running", "gauge", "Targets being checked", [({}, targets["running"])])
+    metric("batch_targets_total", "counter", "Targets finished, by outcome",
+           [({"outcome": "ok"}, targets["completed"] - targets["failed"]),
+            ({"outcome": "failed"}, targets["failed"])])
+    summary("batch_target_seconds", "Time to check one target", [({}, snapshot["target_latency"])])
+    metric("batch_requests_in_flight", "gauge", "Requests sent and not finished", [({}, requests["in_flight"])])
+    metric("batch_requests_total", "counter", "Requests finished, by outcome",
+           [({"outcome": "ok"}, requests["completed"] - requests["failed"]),
+            ({"outcome": "failed"}, requests["failed"])])
+    metric("batch_retries_total", "counter", "Requests retried", [({}, requests["retries"])])
+    summary("batch_request_seconds", "Time per request, by transport",
+            [({"kind": kind}, stats) for kind, stats in sorted(snapshot["request_latency"].items())])
+    metric("batch_received_bytes_total", "counter", "Bytes received", [({}, snapshot["bytes_received"])])
+    metric("batch_received_bytes_per_second", "gauge", "Recent receive rate", [({}, snapshot["bytes_per_second"])])
+    if snapshot["extraction"] is not None:
+        metric("batch_extractions_running", "gauge", "Extractions in progress",
+               [({}, snapshot["extraction"]["extracting"])])
+    for name, label in (("extraction", "extraction memo"), ("http_cache", "HTTP cache"), ("dns_cache", "DNS cache")):
+        if snapshot[name] is not None:
+            metric(f"batch_{name}_hit_ratio", "gauge", f"Share of lookups answered by the {label}",
+                   [({}, snapshot[name]["hit_rate"])])
+    return "\n".join(lines) + "\n"
+
+def format_progress(snapshot):
+    """One human-readable progress line"""
+    targets = snapshot["targets"]
+    latency = snapshot["target_latency"]
+    line = (f"{targets['completed']} done ({targets['failed']} failed), {targets['running']} running, "
+            f"{targets['queued']} queued, {targets['per_second']:.1f}/s, "
+            f"{snapshot['requests']['in_flight']} requests in flight, "
+            f"{snapshot['bytes_per_second'] / 1024:.0f} KiB/s")
+    if latency["count"]:
+        line += f", p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s"
+    if snapshot["extraction"] is not None:
+        line += f", {snapshot['extraction']['extracting']} extracting"
+    return line
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        snapshot = self.server.metrics.snapshot()
+        if self.path == "/metrics":
+            body = format_prometheus(snapshot).encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(snapshot).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """
+    Serve `metrics` on a background thread: /metrics in the Prometheus
+    text format and /metrics.json as a snapshot. Binds to localhost only.
+    """
+
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.metrics = metrics
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+class SnapshotWriter:
+    """
+    Every `interval` seconds write a snapshot of `metrics` to `stream`, as
+    a JSON line or, with `progress`, as one human-readable line. A final
+    snapshot is written on stop().
+    """
+
+    def __init__(self, metrics, stream, interval=5, progress=False):
+        self.metrics = metrics
+        self.stream = stream
+        self.interval = interval
+        self.progress = progress
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _write(self):
+        snapshot = self.metrics.snapshot()
+        self.stream.write((format_progress(snapshot) if self.progress else json.dumps(snapshot)) + "\n")
+        self.stream.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._write()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._write()
@@ -0,0 +1,267 @@
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _compressor(codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=6).compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data, 47)
+
+class BodyWriter:
+    """
+    Compresses and hashes one response body as it streams in. Nothing is
+    added to the store until close(); the compressed bytes are spooled in
+    memory (or a temporary file once large) so that slow downloads never
+    hold the store's lock.
+    """
+
+    def __init__(self, store, fields):
+        self.store = store
+        self.fields = fields
+        self.size = 0
+        self.record = None
+        self._hash = hashlib.sha256()
+        self._compressor = _compressor(store.codec)
+        self._spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        self._spool.write(self._compressor.compress(chunk))
+
+    def close(self, truncated=False):
+        """Add the body (once per distinct hash) and its record; return the record id"""
+        if self.record is None:
+            self._spool.write(self._compressor.flush())
+            self.record = self.store._commit(self.fields, self._hash.hexdigest(), self.size, self._spool,
+                                             truncated)
+            self._spool.close()
+        return self.record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._spool.close()
+
+class ResultStore:
+    """
+    Append-only store of raw responses.
+
+    Bodies are kept byte for byte, compressed with zstd when the zstandard
+    package is installed and gzip otherwise, and deduplicated by SHA-256:
+    identical favicons on a thousand sites take the space of one. They are
+    appended to segment files of up to `segment_size` bytes, and a SQLite
+    index maps each (run, host, port, path) record to its head and to the
+    body's segment and offset. Bodies are read back through read-only
+    memory maps of the segments.
+    """
+
+    def __init__(self, directory=".results", segment_size=256 * 1024 * 1024, codec=None):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.codec = codec or ("zstd" if zstandard is not None else "gzip")
+        os.makedirs(os.path.join(directory, "segments"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._run = None
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT,
+                started REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bodies (
+                hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run INTEGER NOT NULL,
+                host TEXT NOT NULL,
+                port INTEGER,
+                path TEXT NOT NULL,
+                status INTEGER,
+                head BLOB,
+                body_hash TEXT NOT NULL,
+                truncated INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_host ON records (host, path, run);
+            CREATE INDEX IF NOT EXISTS records_run ON records (run);
+        """)
+        row = self._db.execute("SELECT MAX(segment) FROM bodies").fetchone()
+        self._segment = row[0] or 0
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, "segments", f"{segment:06d}.seg")
+
+    def _start_run(self, label):
+        cursor = self._db.execute("INSERT INTO runs (label, started) VALUES (?, ?)", (label, time.time()))
+        self._db.commit()
+        self._run = cursor.lastrowid
+        return self._run
+
+    def start_run(self, label=None):
+        with self._lock:
+            return self._start_run(label)
+
+    def current_run(self):
+        """The run started last by this process, starting one if needed"""
+        with self._lock:
+            if self._run is None:
+                self._start_run(" ".join(sys.argv) or None)
+            return self._run
+
+    def writer(self, host, port, path, status=None, head=b"", run=None):
+        """Return a BodyWriter for one response; close() it to store it"""
+        fields = (run or self.current_run(), host, port, path, status, head)
+        return BodyWriter(self, fields)
+
+    def put(self, host, port, path, status=None, head=b"", body=b"", run=None, truncated=False):
+        """Store a complete response and return its record id"""
+        writer = self.writer(host, port, path, status, head, run)
+        writer.write(body)
+        return writer.close(truncated)
+
+    def _commit(self, fields, body_hash, size, spool, truncated):
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM bodies WHERE hash = ?", (body_hash,)).fetchone() is None:
+                path = self._segment_path(self._segment)
+                if os.path.exists(path) and os.path.getsize(path) >= self.segment_size:
+                    self._segment += 1
+                    path = self._segment_path(self._segment)
+                with open(path, "ab") as f:
+                    offset = f.tell()
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+                    length = f.tell() - offset
+                self._db.execute("INSERT INTO bodies (hash, codec, segment, offset, length, size)"
+                                 " VALUES (?, ?, ?, ?, ?, ?)",
+                                 (body_hash, self.codec, self._segment, offset, length, size))
+            cursor = self._db.execute(
+                "INSERT INTO records (run, host, port, path, status, head, body_hash, truncated, stored_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                fields + (body_hash, int(truncated), time.time()),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def find(self, host=None, path=None, run=None):
+        """Records matching every given field, newest first, as dicts"""
+        clauses, params = [], []
+        for name, value in (("host", host), ("path", path), ("run", run)):
+            if value is not None:
+                clauses.append(f"r.{name} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.id, r.run, r.host, r.port, r.path, r.status, r.body_hash, b.size, b.length,"
+                f" r.truncated, r.stored_at FROM records r JOIN bodies b ON b.hash = r.body_hash {where}"
+                " ORDER BY r.id DESC", params).fetchall()
+        names = ("id", "run", "host", "port", "path", "status", "body_hash", "size", "stored_size",
+                 "truncated", "stored_at")
+        return [dict(zip(names, row)) for row in rows]
+
+    def head(self, record):
+        with self._lock:
+            row = self._db.execute("SELECT head FROM records WHERE id = ?", (record,)).fetchone()
+        if row is None:
+            raise KeyError(record)
+        return bytes(row[0] or b"")
+
+    def _read(self, segment, offset, length):
+        """
+        Bytes of a segment through its read-only map, remapped (and the old
+        map closed) when the segment has grown past it. The copy is made
+        under the lock so that no other thread closes the map meanwhile.
+        """
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < offset + length:
+                if mapped is not None:
+                    mapped.close()
+                with open(self._segment_path(segment), "rb") as f:
+                    mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return mapped[offset:offset + length]
+
+    def body(self, record):
+        """The raw body bytes of a record"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT b.codec, b.segment, b.offset, b.length FROM records r"
+                " JOIN bodies b ON b.hash = r.body_hash WHERE r.id = ?", (record,)).fetchone()
+        if row is None:
+            raise KeyError(record)
+        codec, segment, offset, length = row
+        if length == 0:
+            return b""
+        return _decompress(codec, self._read(segment, offset, length))
+
+    def stats(self):
+        with self._lock:
+            records, distinct = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT body_hash) FROM records").fetchone()
+            size, stored = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM bodies").fetchone()
+        return {"records": records, "bodies": distinct, "body_bytes": size, "stored_bytes": stored,
+                "codec": self.codec}
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._db.close()
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide result store, kept in $RESULT_STORE_DIR if set"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore(os.environ.get("RESULT_STORE_DIR", ".results"))
+        return _default_store
+
+if __name__ == "__main__":
+    # result_store.py [host [path]] lists records; result_store.py --cat ID prints one response
+    store = get_store()
+    if len(sys.argv) == 3 and sys.argv[1] == "--cat":
+        record = int(sys.argv[2])
+        sys.stdout.buffer.write(store.head(record) + store.body(record))
+    else:
+        host = sys.argv[1] if len(sys.argv) > 1 else None
+        path = sys.argv[2] if len(sys.argv) > 2 else None
+        for row in store.find(host, path):
+            stored_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["stored_at"]))
+            print(f"{row['id']:>8} run {row['run']:<5} {stored_at}  {row['status']}  "
+                  f"{row['host']}:{row['port']}{row['path']}  {row['size']} bytes")
+        print(store.stats())
@@ -1,74 +1,28 @@
-import requests
 import sys
 import socket
-import time
-import trafilatura
+from urllib.parse import urlsplit
+
+import extract_memo
+from circuit_breaker import url_key, with_retries
+from fetcher import get_session
+from http_cache import get_cache
+from http_pool import get_pool
+from http_stream import MAX_BODY_SIZE, read_capped
+from result_store import get_store
+from strategies import Strategy, StrategyFailed, get_memory, race
+from timeouts import remaining, timeout_for
 
 def print_separator():
     print("\n" + "=" * 60 + "\n")
 
-def scrape_with_fallbacks(url):
-    """Try different methods to scrape content from a website"""
-    
-    print(f"Attempting to scrape: {url}")
-    
-    # Method 1: Basic requests with custom User-Agent
-    print("Method 1: Using requests with custom User-Agent")
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-        }
-        
-        # Create session with retries
-        session = requests.Session()
-        response = session.get(url, headers=headers, timeout=10, verify=False)
-        print(f"Status code: {response.status_code}")
-        print(f"Content type: {response.headers.get('Content-Type')}")
-        print(f"Content length: {len(response.text)} characters")
-        
-        if len(response.text) > 0:
-            print(f"First 200 characters of content:")
-            print(response.text[:200])
-            print("...")
-            
-            # Try to extract main content with trafilatura
-            print_separator()
-            print("Attempting to extract main content with trafilatura...")
-            extracted_text = trafilatura.extract(response.text)
-            if extracted_text and len(extracted_text) > 0:
-                print(f"Successfully extracted {len(extracted_text)} characters")
-                print("First 200 characters of extracted content:")
-                print(extracted_text[:200])
-                print("...")
-                return extracted_text
-            else:
-                print("Failed to extract content with trafilatura")
-        
-    except requests.exceptions.SSLError as e:
-        print(f"SSL Error: {e}")
-    except requests.exceptions.Timeout as e:
-        print(f"Timeout Error: {e}")
-    except Exception as e:
-        print(f"Error with requests: {type(e).__name__}: {e}")
-    
-    print_separator()
-    
-    # Method 2: Try with HTTP instead of HTTPS
-    http_url = url.replace("https://", "http://")
-    print(f"Method 2: Trying with HTTP: {http_url}")
-    try:
-        response = requests.get(http_url, headers=headers, timeout=10, allow_redirects=False)
-        print(f"Status code: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
-    except Exception as e:
-        print(f"Error with HTTP request: {type(e).__name__}: {e}")
-    
-    print_separator()
-    print("Method 3: Using low-level socket connection")
-    
-    # Parse the domain from the URL
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+def _split_host(url):
+    """Return (domain, port) from a URL, defaulting to port 80"""
     if "://" in url:
         domain = url.split("://")[1].split("/")[0]
     else:
@@ -76,79 +30,133 @@ def scrape_with_fallbacks(url):
     
     if ":" in domain:
         domain, port_str = domain.split(":")
-        port = int(port_str)
-    else:
-        port = 80
-    
-    print(f"Connecting to {domain}:{port}...")
-    
+        return domain, int(port_str)
+    return domain, 80
+
+def _request_target(url):
+    """Path and query of a URL for the request line, "/" when it has none"""
+    parts = urlsplit(url if "://" in url else f"//{url}")
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+def _socket_can_fetch(url):
+    """The socket method speaks plain HTTP only"""
+    return "://" not in url or url.startswith("http://")
+
+def _timeouts(url, connect=10, read=10):
+    """(connect, read) timeouts for requests, learned per host and cut to the deadline"""
+    domain, _ = _split_host(url)
+    return timeout_for(domain, "connect", connect), timeout_for(domain, "read", read)
+
+def _extract_or_fail(name, html):
+    extracted_text = extract_memo.extract(html)
+    if not extracted_text:
+        raise StrategyFailed("Failed to extract content with trafilatura")
+    print(f"[{name}] Successfully extracted {len(extracted_text)} characters")
+    return extracted_text
+
+def via_requests(url, cancel, max_bytes=MAX_BODY_SIZE):
+    """Method 1: requests with a browser User-Agent"""
+    response = with_retries(url_key(url), lambda attempt: get_cache().get(
+        url, headers=BROWSER_HEADERS, session=get_session(), timeout=_timeouts(url), max_bytes=max_bytes, verify=False))
+    print(f"[requests] Status code: {response.status_code}")
+    if response.from_cache:
+        print(f"[requests] Served from cache ({response.from_cache})")
+    print(f"[requests] Content type: {response.headers.get('Content-Type')}")
+    # requests decodes again on every .text access, so decode once
+    text = response.text
+    print(f"[requests] Content length: {len(text)} characters")
+    if response.truncated:
+        print(f"[requests] Truncated at {max_bytes} bytes")
+    if cancel.is_set() or not text:
+        raise StrategyFailed("No content")
+    return _extract_or_fail("requests", text)
+
+def via_plain_http(url, cancel, max_bytes=MAX_BODY_SIZE):
+    """Method 2: the same URL over plain HTTP, without following redirects"""
+    http_url = url.replace("https://", "http://")
+    response = with_retries(url_key(http_url), lambda attempt: get_session().get(
+        http_url, headers=BROWSER_HEADERS, timeout=_timeouts(http_url), allow_redirects=False, stream=True))
+    response._content, truncated = read_capped(response.iter_content(65536), max_bytes)
+    response.close()
+    print(f"[http] Status code: {response.status_code}")
+    print(f"[http] Headers: {dict(response.headers)}")
+    if truncated:
+        print(f"[http] Truncated at {max_bytes} bytes")
+    text = response.text
+    if cancel.is_set() or response.status_code != 200 or not text:
+        raise StrategyFailed(f"HTTP status {response.status_code}")
+    return _extract_or_fail("http", text)
+
+def via_socket(url, cancel, raw_fallback=None, max_bytes=MAX_BODY_SIZE):
+    """Method 3: pooled low-level socket connection on port 80"""
+    domain, port = _split_host(url)
+    print(f"[socket] Connecting to {domain}:{port}...")
+    with get_pool().stream("GET", domain, _request_target(url), port=port, timeout=5) as response:
+        print(f"[socket] Status: {response.status_line}")
+        # Decode only the body, never the headers, as it arrives
+        response_text = response.read_text(max_bytes)
+    print(f"[socket] Received {response.body_size} bytes of body"
+          + (f", truncated at {max_bytes}" if response.truncated else ""))
+    if cancel.is_set() or not response_text:
+        raise StrategyFailed("No data received")
+    if raw_fallback is not None:
+        raw_fallback.append(response_text)
+
+    # Only hand over pages that have an HTML body; a truncated page may
+    # have lost its closing tags, which extraction tolerates
+    if "<body" not in response_text:
+        raise StrategyFailed("No <body> in response")
+    return _extract_or_fail("socket", response_text)
+
+def scrape(url, stagger=1.0, timeout=30, memory=None, max_bytes=MAX_BODY_SIZE):
+    """
+    Race the scrape methods for `url` and return a result dict with the
+    winning `strategy` and the extracted `text`.
+
+    The methods race as described in strategies.race(): by default each one
+    gets a one second head start before the next joins, and the method that
+    last worked for this host goes first. Pass `stagger=None` for the old
+    strictly sequential behaviour. `timeout` is cut to the current deadline.
+    Each method reads at most `max_bytes` of the page. The socket method
+    only joins for plain HTTP URLs. When nothing could be extracted but the
+    socket method got a page, that raw page is returned as `raw`.
+    """
+    result = {"url": url, "strategy": None, "text": None, "raw": None, "error": None}
+    raw_fallback = []
+    methods = [
+        Strategy("requests", lambda target, cancel: via_requests(target, cancel, max_bytes)),
+        Strategy("http", lambda target, cancel: via_plain_http(target, cancel, max_bytes)),
+    ]
+    if _socket_can_fetch(url):
+        # Left out of the race, and so out of the winner memory, for URLs it would get wrong
+        methods.append(Strategy("socket", lambda target, cancel: via_socket(target, cancel, raw_fallback, max_bytes)))
+    domain, _ = _split_host(url)
     try:
-        # Create socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(5)
-        
-        # Connect
-        s.connect((domain, port))
-        
-        # Send HTTP request
-        request = f"GET / HTTP/1.1\r\nHost: {domain}\r\nUser-Agent: Mozilla/5.0\r\nAccept: */*\r\nConnection: close\r\n\r\n"
-        s.sendall(request.encode())
-        
-        # Receive response
-        print("Receiving data...")
-        chunks = []
-        while True:
-            try:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                chunks.append(chunk)
-            except socket.timeout:
-                print("Socket receive timed out, but we have some data")
-                break
-        
-        # Process response
-        response_data = b''.join(chunks)
-        print(f"Received {len(response_data)} bytes")
-        
-        if response_data:
-            # Try to decode to utf-8, falling back to latin-1
-            try:
-                response_text = response_data.decode('utf-8')
-            except UnicodeDecodeError:
-                response_text = response_data.decode('latin-1')
-            
-            # Print first part
-            print("First 200 characters:")
-            print(response_text[:200])
-            print("...")
-            
-            # Try to extract HTML body
-            if "<body" in response_text and "</body>" in response_text:
-                body_start = response_text.find("<body")
-                body_end = response_text.find("</body>") + 7
-                body_content = response_text[body_start:body_end]
-                print("Found body content, extracting with trafilatura...")
-                extracted_text = trafilatura.extract(body_content)
-                if extracted_text:
-                    print(f"Extracted {len(extracted_text)} characters")
-                    print(extracted_text[:200])
-                    return extracted_text
-                else:
-                    print("Failed to extract text from body content")
-            
-            return response_text
-    except socket.timeout:
-        print("Socket connection timed out")
-    except Exception as e:
-        print(f"Socket error: {type(e).__name__}: {e}")
-    finally:
-        try:
-            s.close()
-        except:
-            pass
-    
-    return "Failed to fetch content from the website."
+        result["strategy"], result["text"] = race(url, methods, stagger=stagger, timeout=remaining(timeout),
+                                                  memory=memory or get_memory(), host=domain)
+    except StrategyFailed as e:
+        result["error"] = str(e)
+        if raw_fallback:
+            result["raw"] = raw_fallback[0]
+    return result
+
+def scrape_with_fallbacks(url, stagger=1.0, timeout=30, memory=None):
+    """Try different methods to scrape content from a website, see scrape()"""
+    print(f"Attempting to scrape: {url}")
+    result = scrape(url, stagger, timeout, memory)
+    if result["error"]:
+        print(f"All methods failed: {result['error']}")
+        if result["raw"] is not None:
+            # The socket method got a page but nothing could be extracted
+            return result["raw"]
+        return "Failed to fetch content from the website."
+
+    print_separator()
+    print(f"Method '{result['strategy']}' won")
+    print("First 200 characters of extracted content:")
+    print(result["text"][:200])
+    print("...")
+    return result["text"]
 
 if __name__ == "__main__":
     # Disable SSL warnings
@@ -162,82 +170,32 @@ if __name__ == "__main__":
     # Skip method 1 and go directly to method 3 (socket connection)
     print("Skipping to Method 3: Using low-level socket connection")
     
-    # Parse the domain from the URL
-    if "://" in url:
-        domain = url.split("://")[1].split("/")[0]
-    else:
-        domain = url.split("/")[0]
-    
-    if ":" in domain:
-        domain, port_str = domain.split(":")
-        port = int(port_str)
-    else:
-        port = 80
+    # Parse the domain and the requested path from the URL
+    domain, port = _split_host(url)
+    path = _request_target(url)
     
     print(f"Connecting to {domain}:{port}...")
     
     try:
-        # Create socket
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(2)  # Very short timeout
-        
-        # Connect
-        s.connect((domain, port))
-        
-        # Send HTTP request
-        request = f"GET / HTTP/1.1\r\nHost: {domain}\r\nUser-Agent: Mozilla/5.0\r\nAccept: */*\r\nConnection: close\r\n\r\n"
-        s.sendall(request.encode())
-        
-        # Receive response
-        print("Receiving data...")
-        chunks = []
-        start_time = time.time()
-        max_time = 3  # Maximum 3 seconds
-        
-        while time.time() - start_time < max_time:
-            try:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                chunks.append(chunk)
-            except socket.timeout:
-                print("Socket receive timed out, but we have some data")
-                break
-        
-        # Process response
-        response_data = b''.join(chunks)
-        print(f"Received {len(response_data)} bytes")
-        
-        if response_data:
-            # Try to decode to utf-8, falling back to latin-1
-            try:
-                response_text = response_data.decode('utf-8')
-            except UnicodeDecodeError:
-                response_text = response_data.decode('latin-1')
+        with get_pool().stream("GET", domain, path, port=port, timeout=2) as response:  # Very short timeout
+            print("Receiving data...")
+            head = response.raw_head()
+            
+            # Stream the raw response into the result store as it arrives
+            preview = bytearray(head)
+            with get_store().writer(domain, port, path, response.status, head) as writer:
+                for chunk in response.iter_body():
+                    writer.write(chunk)
+                    if len(preview) < 200:
+                        preview += chunk[:200 - len(preview)]
+            print(f"Received {len(head) + response.body_size} bytes")
+            print(f"Raw response stored as record {writer.record} (python result_store.py --cat {writer.record})")
             
             # Print first part
             print("First 200 characters:")
-            print(response_text[:200])
+            print(preview[:200].decode('utf-8', errors='replace'))
             print("...")
-            
-            # Save the raw response to a file
-            with open("raw_response.txt", "w", encoding="utf-8") as f:
-                f.write(response_text)
-            print("Raw response saved to raw_response.txt")
-            
-            # Save only headers to a separate file
-            headers_end = response_text.find("\r\n\r\n")
-            if headers_end > 0:
-                headers = response_text[:headers_end]
-                with open("headers_only.txt", "w", encoding="utf-8") as f:
-                    f.write(headers)
-                print("Headers saved to headers_only.txt")
     except socket.timeout:
         print("Socket connection timed out")
     except Exception as e:
         print(f"Socket error: {type(e).__name__}: {e}")
-    finally:
-        try:
-            s.close()
-        except:
-            pass
\ No newline at end of file
@@ -0,0 +1,162 @@
+import atexit
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from timeouts import propagate
+
+class StrategyFailed(Exception):
+    """A strategy ran but did not produce a usable result"""
+
+class Strategy:
+    """
+    A named way of fetching a target.
+
+    `func(target, cancel)` returns a result or raises. `cancel` is a
+    threading.Event that is set once another strategy has won, so long
+    running strategies should check it between steps and give up early.
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+
+    def __repr__(self):
+        return f"Strategy({self.name!r})"
+
+class WinnerMemory:
+    """
+    Remembers which strategy last won for each host, optionally on disk.
+
+    Changes are written to `path` at most every `flush_interval` seconds
+    and once more at exit, never while other threads wait on the lock.
+    """
+
+    def __init__(self, path=None, flush_interval=5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._winners = {}
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._winners = json.load(f)
+            except (OSError, ValueError):
+                self._winners = {}
+        if path:
+            atexit.register(self.flush)
+
+    def get(self, host):
+        with self._lock:
+            return self._winners.get(host)
+
+    def record(self, host, name):
+        with self._lock:
+            if self._winners.get(host) == name:
+                return
+            self._winners[host] = name
+            self._dirty = True
+            due = self.path and time.monotonic() - self._flushed_at >= self.flush_interval
+            if due:
+                # Only this thread flushes for this interval
+                self._flushed_at = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the winners to `path` if they changed since the last write"""
+        if not self.path:
+            return
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                winners = dict(self._winners)
+                self._dirty = False
+                self._flushed_at = time.monotonic()
+            temp_path = f"{self.path}.tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(winners, f, indent=2)
+                os.replace(temp_path, self.path)
+            except OSError:
+                # The memory is only a hint; try again on the next flush
+                with self._lock:
+                    self._dirty = True
+
+    def order(self, host, strategies):
+        """Put the last winner for `host` first, keeping the rest in order"""
+        winner = self.get(host)
+        return sorted(strategies, key=lambda strategy: strategy.name != winner)
+
+def race(target, strategies, stagger=0.5, timeout=None, memory=None, host=None):
+    """
+    Run strategies against `target` and return (name, result) of the first
+    one that succeeds.
+
+    With `stagger=0` every strategy starts at once. With a positive stagger
+    the next strategy starts when the previous one fails or after `stagger`
+    seconds, whichever comes first (happy eyeballs). With `stagger=None`
+    strategies run strictly one after another. Losers are cancelled. Raises
+    StrategyFailed with every error if none succeeds within `timeout`.
+    Strategies run under the caller's deadline, if any.
+    """
+    if memory is not None and host is not None:
+        strategies = memory.order(host, strategies)
+    pending_strategies = list(strategies)
+    cancel = threading.Event()
+    errors = []
+    running = {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    executor = ThreadPoolExecutor(max_workers=max(len(pending_strategies), 1))
+    try:
+        while pending_strategies or running:
+            if pending_strategies and (not running or stagger is not None):
+                strategy = pending_strategies.pop(0)
+                running[executor.submit(propagate(strategy.func), target, cancel)] = strategy
+                if stagger == 0:
+                    continue
+
+            wait_for = None
+            if pending_strategies and stagger:
+                wait_for = stagger
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    errors.append(("deadline", f"No strategy succeeded within {timeout:.1f}s"))
+                    break
+                wait_for = remaining if wait_for is None else min(wait_for, remaining)
+
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                strategy = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((strategy.name, f"{type(e).__name__}: {e}"))
+                    continue
+                if memory is not None and host is not None:
+                    memory.record(host, strategy.name)
+                return strategy.name, result
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    raise StrategyFailed("; ".join(f"{name}: {error}" for name, error in errors))
+
+_default_memory = None
+_default_memory_lock = threading.Lock()
+
+def get_memory():
+    """Return the process-wide winner memory, stored in $STRATEGY_MEMORY_FILE if set"""
+    global _default_memory
+    with _default_memory_lock:
+        if _default_memory is None:
+            _default_memory = WinnerMemory(os.environ.get("STRATEGY_MEMORY_FILE", ".strategy_winners.json"))
+        return _default_memory
@@ -1,18 +1,12 @@
-import trafilatura
 import sys
 import requests
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+
+from fetcher import decode_content, fetch_and_extract
 
 def test_website(url):
     print(f"Testing extraction from: {url}")
     
     try:
-        # Create a session with retries and longer timeout
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.5)
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-        
         # Add headers to mimic a browser
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -23,37 +17,37 @@ def test_website(url):
             'Cache-Control': 'max-age=0'
         }
         
+        # Download once with requests and extract from the same bytes;
+        # retries and the circuit breaker are shared with every other fetch
         print("Attempting with requests...")
-        response = session.get(url, headers=headers, timeout=10)
-        print(f"HTTP Status: {response.status_code}")
-        print(f"Content type: {response.headers.get('Content-Type')}")
-        content_length = len(response.text)
+        result = fetch_and_extract(url, headers=headers, timeout=10)
+        print(f"HTTP Status: {result['status']}")
+        print(f"Transport: {result['transport']}")
+        print(f"Content type: {result['headers'].get('Content-Type')}")
+        html = decode_content(result)
+        content_length = len(html)
         print(f"Content length: {content_length} characters")
         
         if content_length > 0:
             print("\nFirst 100 characters of HTML:")
-            print(response.text[:100])
+            print(html[:100])
+        else:
+            print("Failed to download content")
+            return False
         
-        # Try with trafilatura
         print("\nAttempting with trafilatura...")
-        downloaded = trafilatura.fetch_url(url)
-        if downloaded:
-            print("Content downloaded successfully with trafilatura")
-            text = trafilatura.extract(downloaded)
-            if text:
-                print(f"Successfully extracted {len(text)} characters of content")
-                print("First 200 characters:")
-                print(text[:200])
-                return True
-            else:
-                print("No text content could be extracted")
-                print("This could mean:")
-                print("- The site is mostly JavaScript-rendered content")
-                print("- The site has a structure trafilatura can't parse")
-                print("- The site might be returning a special page to scrapers")
-                return False
+        text = result["text"]
+        if text:
+            print(f"Successfully extracted {len(text)} characters of content")
+            print("First 200 characters:")
+            print(text[:200])
+            return True
         else:
-            print("Failed to download content with trafilatura")
+            print("No text content could be extracted")
+            print("This could mean:")
+            print("- The site is mostly JavaScript-rendered content")
+            print("- The site has a structure trafilatura can't parse")
+            print("- The site might be returning a special page to scrapers")
             return False
             
     except requests.exceptions.Timeout:
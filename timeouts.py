@@ -0,0 +1,152 @@
+import contextlib
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+from tracing import Histogram, get_tracer
+
+class DeadlineExceeded(TimeoutError):
+    """The overall budget for a target ran out before a request could start"""
+
+class Deadline:
+    """A point in monotonic time by which all work for one target must end"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+
+    def remaining(self):
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+@contextlib.contextmanager
+def deadline(budget):
+    """
+    Run the block under an overall budget of `budget` seconds. Every probe
+    and fallback inside it (including asyncio tasks and to_thread calls,
+    which copy the context) cuts its timeouts to what is left. A nested
+    budget can only shrink the outer one.
+    """
+    new_deadline = Deadline(budget)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires < new_deadline.expires:
+        new_deadline = outer
+    token = _current_deadline.set(new_deadline)
+    try:
+        yield new_deadline
+    finally:
+        _current_deadline.reset(token)
+
+def current_deadline():
+    return _current_deadline.get()
+
+def remaining(default=None):
+    """Seconds left of the current deadline, capped at `default`"""
+    current = _current_deadline.get()
+    if current is None:
+        return default
+    if default is None:
+        return current.remaining()
+    return min(default, current.remaining())
+
+def propagate(func):
+    """
+    Wrap `func` to run in a copy of the caller's context, so that a
+    deadline carries over into ThreadPoolExecutor workers
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+class AdaptiveTimeouts:
+    """
+    Per-host timeouts learned from observed round trips.
+
+    Every finished trace that names a host feeds two per-host histograms:
+    "connect" (TCP plus TLS) and "read" (request sent to first byte). DNS is
+    left out because cache hits would teach it a uselessly short timeout.
+    Once a phase has `min_samples` observations its timeout is the p95
+    times `factor`, clamped to [`floor`, `ceiling`]; until then the caller's
+    default applies. The learned value only ever raises the caller's
+    timeout: slow but healthy hosts get more time than the default, while a
+    slow page on a fast host still gets the time the caller allowed. The
+    histograms of the `max_hosts` most recently seen hosts are kept.
+    """
+
+    def __init__(self, factor=4, floor=0.5, ceiling=30, min_samples=5, max_hosts=10000):
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.max_hosts = max_hosts
+        self._histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, host, phase, seconds):
+        with self._lock:
+            histogram = self._histograms.get((host, phase))
+            if histogram is None:
+                histogram = self._histograms[(host, phase)] = Histogram()
+            self._histograms.move_to_end((host, phase))
+            histogram.observe(seconds)
+            # Two phases per host
+            while len(self._histograms) > 2 * self.max_hosts:
+                self._histograms.popitem(last=False)
+
+    def record(self, event):
+        """Tracer sink: learn from every successful trace"""
+        host = event.get("host")
+        if host is None or event["error"] is not None:
+            return
+        phases = event["phases"]
+        if "connect" in phases:
+            self.observe(host, "connect", phases["connect"] + phases.get("tls", 0.0))
+        if "first_byte" in phases:
+            self.observe(host, "read", phases["first_byte"])
+
+    def timeout(self, host, phase, default):
+        """Learned timeout for `phase` of requests to `host` if longer than `default`, else `default`"""
+        if default is None:
+            return None
+        with self._lock:
+            histogram = self._histograms.get((host, phase))
+            if histogram is None or histogram.count < self.min_samples:
+                return default
+            p95 = histogram.percentile(95)
+        return max(min(max(p95 * self.factor, self.floor), self.ceiling), default)
+
+    def stats(self):
+        with self._lock:
+            return {f"{host} {phase}": histogram.percentile(95)
+                    for (host, phase), histogram in sorted(self._histograms.items())}
+
+def timeout_for(host, phase, default):
+    """
+    Timeout for one phase ("dns", "connect" or "read") of a request to
+    `host`: `default`, or the learned per-host value if longer, cut to what is left
+    of the current deadline. Raises DeadlineExceeded once it has passed.
+    """
+    timeout = get_timeouts().timeout(host, phase, default)
+    current = _current_deadline.get()
+    if current is None:
+        return timeout
+    left = current.remaining()
+    if left <= 0:
+        raise DeadlineExceeded(f"Budget of {current.budget}s for this target exhausted")
+    return left if timeout is None else min(timeout, left)
+
+_default_timeouts = None
+_default_timeouts_lock = threading.Lock()
+
+def get_timeouts():
+    """Return the process-wide adaptive timeouts, fed by the process-wide tracer"""
+    global _default_timeouts
+    with _default_timeouts_lock:
+        if _default_timeouts is None:
+            _default_timeouts = AdaptiveTimeouts()
+            get_tracer().add_sink(_default_timeouts.record)
+        return _default_timeouts
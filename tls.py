@@ -0,0 +1,80 @@
+import collections
+import ssl
+import threading
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+def get_ssl_context(verify=True):
+    """
+    Return the shared SSLContext for a verification mode: True for the
+    system trust store, False for no verification, or a CA bundle path.
+    Contexts are built once; loading a trust store costs milliseconds.
+    """
+    with _contexts_lock:
+        context = _contexts.get(verify)
+        if context is None:
+            if verify is False:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            elif verify is True:
+                context = ssl.create_default_context()
+            else:
+                context = ssl.create_default_context(cafile=verify)
+            _contexts[verify] = context
+        return context
+
+class TLSSessionCache:
+    """
+    The most recent TLS session per (context, host, port), so that a new
+    connection to a host resumes the last one's session instead of doing a
+    full handshake. TLS 1.3 tickets arrive after the handshake, so sessions
+    are remembered once a response has been read.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.full = 0
+
+    def wrap(self, sock, host, port, context=None):
+        """Wrap `sock` for `host`, offering the cached session if there is one"""
+        context = context or get_ssl_context()
+        key = (context, host, port)
+        with self._lock:
+            session = self._sessions.get(key)
+        tls_sock = context.wrap_socket(sock, server_hostname=host, session=session)
+        with self._lock:
+            if tls_sock.session_reused:
+                self.resumed += 1
+            else:
+                self.full += 1
+        return tls_sock
+
+    def remember(self, tls_sock, host, port):
+        session = tls_sock.session
+        if session is None:
+            return
+        with self._lock:
+            key = (tls_sock.context, host, port)
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def stats(self):
+        return {"resumed": self.resumed, "full": self.full, "sessions": len(self._sessions)}
+
+_default_sessions = None
+_default_sessions_lock = threading.Lock()
+
+def get_tls_sessions():
+    """Return the process-wide TLS session cache"""
+    global _default_sessions
+    with _default_sessions_lock:
+        if _default_sessions is None:
+            _default_sessions = TLSSessionCache()
+        return _default_sessions
@@ -0,0 +1,201 @@
+import bisect
+import math
+import threading
+import time
+
+# Phases in the order they happen; each is recorded as seconds since the
+# start of the trace
+PHASES = ("dns", "connect", "tls", "request_sent", "first_byte", "body_complete")
+
+class Histogram:
+    """
+    Log-bucketed latency histogram.
+
+    Buckets grow by `growth` from `minimum` seconds, so percentiles are exact
+    to within one bucket width (about 10% by default) however many values
+    are observed. Histograms with the same buckets share one bounds tuple.
+    """
+
+    _bounds = {}
+
+    def __init__(self, minimum=0.0001, maximum=600, growth=1.1):
+        self.bounds = self._bounds.get((minimum, maximum, growth))
+        if self.bounds is None:
+            bounds = []
+            bound = minimum
+            while bound < maximum:
+                bounds.append(bound)
+                bound *= growth
+            bounds.append(maximum)
+            self.bounds = self._bounds[(minimum, maximum, growth)] = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile"""
+        if not self.count:
+            return None
+        rank = max(math.ceil(self.count * p / 100), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else None,
+        }
+
+class Trace:
+    """Monotonic per-phase timings, byte counts and retries for one fetch"""
+
+    def __init__(self, tracer, kind, target, host=None):
+        self.tracer = tracer
+        self.kind = kind
+        self.target = target
+        self.host = host
+        self.start = time.monotonic()
+        self.marks = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.reused = False
+        self.error = None
+        self.finished = False
+
+    def mark(self, phase, at=None):
+        """Record that `phase` ended now, or `at` seconds into the trace"""
+        self.marks[phase] = time.monotonic() - self.start if at is None else at
+
+    def durations(self):
+        """Time spent in each phase that was reached, in seconds"""
+        durations = {}
+        previous = 0.0
+        for phase in PHASES:
+            if phase in self.marks:
+                durations[phase] = self.marks[phase] - previous
+                previous = self.marks[phase]
+        return durations
+
+    def finish(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else error
+        self.total = time.monotonic() - self.start
+        self.tracer.record(self)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "target": self.target,
+            "host": self.host,
+            "marks": self.marks,
+            "phases": self.durations(),
+            "total": getattr(self, "total", None),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+            "reused": self.reused,
+            "error": self.error,
+        }
+
+class Tracer:
+    """Collects finished traces into per-phase histograms and event sinks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sinks = []
+        self.histograms = {}
+        self.counters = {"traces": 0, "errors": 0, "retries": 0, "bytes_sent": 0, "bytes_received": 0}
+        # Traces started and not finished yet
+        self.in_flight = 0
+
+    def start(self, kind, target, host=None):
+        with self._lock:
+            self.in_flight += 1
+        return Trace(self, kind, target, host)
+
+    def add_sink(self, sink):
+        """Call `sink(event_dict)` for every finished trace"""
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink):
+        with self._lock:
+            self._sinks.remove(sink)
+
+    def _observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def record(self, trace):
+        event = trace.to_dict()
+        with self._lock:
+            self.in_flight -= 1
+            self.counters["traces"] += 1
+            self.counters["errors"] += trace.error is not None
+            self.counters["retries"] += trace.retries
+            self.counters["bytes_sent"] += trace.bytes_sent
+            self.counters["bytes_received"] += trace.bytes_received
+            for phase, duration in event["phases"].items():
+                self._observe(f"{trace.kind}.{phase}", duration)
+            self._observe(f"{trace.kind}.total", event["total"])
+            sinks = list(self._sinks)
+        for sink in sinks:
+            sink(event)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            for name in self.counters:
+                self.counters[name] = 0
+
+def format_summary(summary):
+    """Render Tracer.summary() as a fixed-width table in milliseconds"""
+    lines = [f"{'phase':<28}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+    for name, stats in summary["histograms"].items():
+        cells = [f"{stats[key] * 1000:>10.1f}" for key in ("p50", "p95", "p99", "max")]
+        lines.append(f"{name:<28}{stats['count']:>8}" + "".join(cells))
+    counters = summary["counters"]
+    lines.append(f"{counters['traces']} traces, {counters['errors']} errors, {counters['retries']} retries, "
+                 f"{counters['bytes_received']} bytes received")
+    return "\n".join(lines)
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Return the process-wide tracer"""
+    global _default_tracer
+    with _default_tracer_lock:
+        if _default_tracer is None:
+            _default_tracer = Tracer()
+        return _default_tracer